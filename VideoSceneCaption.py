@@ -6,10 +6,13 @@ import numpy as np
 from PIL import Image
 import folder_paths
 import json
+import time
 import hashlib
 import urllib.parse
 from typing import List
 import warnings
+from .keyframe_index import read_frames
+from . import model_registry, caption_store, frame_dedup, cpu_inference, video_fingerprint, scene_catalog
 warnings.filterwarnings("ignore")
 
 try:
@@ -19,6 +22,17 @@ except ImportError:
     USE_COMFY_PROGRESS = False
     print("Note: comfy.utils not available, using simple progress display")
 
+# Model and prompt used for Moondream2 frame descriptions
+MOONDREAM_MODEL_ID = "vikhyatk/moondream2"
+FRAME_QUESTION = "Describe this image in detail, including setting, characters, actions, and mood."
+
+# Hugging Face models behind the LLM choices, unknown names use Phi-3
+LLM_MODEL_IDS = {
+    "phi-3-mini-4k": "microsoft/Phi-3-mini-4k-instruct",
+    "qwen2.5-7b": "Qwen/Qwen2.5-7B-Instruct",
+    "mistral-7b": "mistralai/Mistral-7B-Instruct-v0.2",
+}
+
 class VideoSceneCaption:
     @classmethod
     def INPUT_TYPES(cls):
@@ -70,6 +84,36 @@ class VideoSceneCaption:
                 "video_scenes_output_path": ("STRING", {
                     "default": "",
                 }),
+                "keep_models_loaded": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Keep Models Loaded",
+                    "label_off": "Unload After Run"
+                }),
+                "caption_dedup_threshold": ("INT", {
+                    "default": frame_dedup.DEFAULT_DEDUP_THRESHOLD,
+                    "min": 0,
+                    "max": 16,
+                    "step": 1,
+                }),
+                "cpu_precision": (cpu_inference.CPU_PRECISIONS, {
+                    "default": "float32"
+                }),
+                "cpu_threads": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 256,
+                    "step": 1,
+                }),
+                "cpu_warmup": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Warm Up And Measure",
+                    "label_off": "No Warm-up"
+                }),
+                "export_metadata_json": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Write metadata.json",
+                    "label_off": "Catalog Only"
+                }),
             }
         }
 
@@ -82,10 +126,6 @@ class VideoSceneCaption:
     def __init__(self):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         self.progress_bar = None
-        self.moondream_tokenizer = None
-        self.moondream_model = None
-        self.llm_tokenizer = None
-        self.llm_model = None
         self.last_video_paths = None
         self.last_index = None
     
@@ -129,8 +169,12 @@ class VideoSceneCaption:
             print(f"Error getting video duration: {e}")
             return 0
     
-    def extract_keyframes(self, video_path, interval_seconds, max_frames):
-        """Extract keyframes at regular intervals throughout the video"""
+    def extract_keyframes(self, video_path, interval_seconds, max_frames, index_dir=None):
+        """
+        Extract keyframes at regular intervals throughout the video
+        Frames are decoded in one forward pass, seeking only to keyframes listed in the
+        video's keyframe index (cached in index_dir)
+        """
         try:
             cap = cv2.VideoCapture(video_path)
             if not cap.isOpened():
@@ -148,111 +192,161 @@ class VideoSceneCaption:
             if num_frames < 3:
                 num_frames = 3
             
-            frames = []
+            cap.release()
+            
+            samples = []
             for i in range(num_frames):
                 # Evenly distribute frames throughout the video
                 time_point = (i / (num_frames - 1)) * duration if num_frames > 1 else 0
                 frame_idx = int(time_point * fps)
-                frame_idx = min(frame_idx, total_frames - 1)
-                
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                if ret:
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    frames.append((time_point, Image.fromarray(frame_rgb)))
+                frame_idx = max(0, min(frame_idx, total_frames - 1))
+                samples.append((time_point, frame_idx))
             
-            cap.release()
-            return frames
+            images = {}
+            for frame_idx, frame in read_frames(video_path, [idx for _, idx in samples], index_dir):
+                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                images[frame_idx] = Image.fromarray(frame_rgb)
+            
+            return [(time_point, images[idx]) for time_point, idx in samples if idx in images]
             
         except Exception as e:
             print(f"Error extracting keyframes: {e}")
             return []
     
-    def load_moondream_model(self):
-        """Load Moondream2 model for frame descriptions"""
-        if self.moondream_model is not None:
-            return self.moondream_tokenizer, self.moondream_model
+    def load_moondream_model(self, cpu_precision="float32", cpu_threads=0, cpu_warmup=True):
+        """
+        Load Moondream2 model for frame descriptions, shared through the model registry.
+        On CPU the model is loaded in cpu_precision and, with cpu_warmup, warmed up on a
+        fixed fixture with the captions/s reported.
+        """
+        on_cpu = self.device.type != "cuda"
+        if on_cpu:
+            cpu_inference.configure_threads(cpu_threads)
         
-        try:
-            print(f"\nLoading Moondream2 model...\n")
-            
-            from transformers import AutoModelForCausalLM, AutoTokenizer
-            
-            self.moondream_tokenizer = AutoTokenizer.from_pretrained(
-                "vikhyatk/moondream2", 
-                trust_remote_code=True
-            )
-            
-            self.moondream_model = AutoModelForCausalLM.from_pretrained(
-                "vikhyatk/moondream2",
-                trust_remote_code=True,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            ).to(self.device)
-            
-            self.moondream_model.eval()
-            print("Moondream2 model loaded successfully!\n")
-            return self.moondream_tokenizer, self.moondream_model
-            
-        except Exception as e:
-            print(f"Failed to load Moondream2 model: {e}")
-            return None, None
+        def caption_image(models, image):
+            tokenizer, model = models
+            return model.answer_question(model.encode_image(image), FRAME_QUESTION, tokenizer)
+        
+        def loader():
+            try:
+                print(f"\nLoading Moondream2 model...\n")
+                
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+                
+                tokenizer = AutoTokenizer.from_pretrained(
+                    "vikhyatk/moondream2", 
+                    trust_remote_code=True
+                )
+                
+                model = AutoModelForCausalLM.from_pretrained(
+                    "vikhyatk/moondream2",
+                    trust_remote_code=True,
+                    torch_dtype=torch.float16 if not on_cpu else cpu_inference.get_cpu_dtype(cpu_precision),
+                ).to(self.device)
+                
+                model.eval()
+                if on_cpu:
+                    fixture = cpu_inference.fixture_images(1)[0]
+                    model = cpu_inference.prepare_model(model, cpu_precision,
+                                                        check=lambda m: caption_image((tokenizer, m), fixture))
+                print("Moondream2 model loaded successfully!\n")
+                return tokenizer, model
+                
+            except Exception as e:
+                print(f"Failed to load Moondream2 model: {e}")
+                return None
+        
+        warmup = cpu_inference.throughput_warmup(caption_image) if on_cpu and cpu_warmup else None
+        models = model_registry.get_model(cpu_inference.get_model_key(MOONDREAM_MODEL_ID, self.device, cpu_precision),
+                                          loader, warmup)
+        return models if models else (None, None)
     
-    def load_llm_model(self, model_name):
-        """Load the selected LLM model"""
+    def load_llm_model(self, model_name, cpu_precision="float32", cpu_threads=0, cpu_warmup=True):
+        """
+        Load the selected LLM model, shared through the model registry.
+        On CPU the model is loaded in cpu_precision; cpu_warmup runs a short generation
+        after loading so the first summary doesn't pay for kernel selection.
+        """
         if model_name == "none":
             return None, None
         
-        if self.llm_model is not None:
-            return self.llm_tokenizer, self.llm_model
+        on_cpu = self.device.type != "cuda"
+        if on_cpu:
+            cpu_inference.configure_threads(cpu_threads)
         
-        try:
-            print(f"\nLoading LLM model: {model_name}...\n")
-            
-            from transformers import AutoModelForCausalLM, AutoTokenizer
-            
-            model_map = {
-                "phi-3-mini-4k": "microsoft/Phi-3-mini-4k-instruct",
-                "qwen2.5-7b": "Qwen/Qwen2.5-7B-Instruct",
-                "mistral-7b": "mistralai/Mistral-7B-Instruct-v0.2",
-            }
-            
-            model_id = model_map.get(model_name, "microsoft/Phi-3-mini-4k-instruct")
-            
-            # Load tokenizer
-            self.llm_tokenizer = AutoTokenizer.from_pretrained(
-                model_id,
-                trust_remote_code=True
-            )
-            
-            # Set padding token if needed
-            if self.llm_tokenizer.pad_token is None:
-                self.llm_tokenizer.pad_token = self.llm_tokenizer.eos_token
-            
-            # Load model
-            self.llm_model = AutoModelForCausalLM.from_pretrained(
-                model_id,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto",
-                trust_remote_code=True,
-            )
-            
-            print(f"LLM model {model_name} loaded successfully!\n")
-            return self.llm_tokenizer, self.llm_model
-            
-        except Exception as e:
-            print(f"Failed to load LLM model: {e}")
-            print("\nNote: Some models may require Hugging Face authentication.")
-            print("Try running: huggingface-cli login")
-            return None, None
+        model_id = LLM_MODEL_IDS.get(model_name, LLM_MODEL_IDS["phi-3-mini-4k"])
+        
+        def generate_text(models, prompt, max_new_tokens=4):
+            tokenizer, model = models
+            inputs = tokenizer(prompt, return_tensors="pt").to(self.device)
+            return model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False,
+                                  pad_token_id=tokenizer.pad_token_id)
+        
+        def warmup(models):
+            with torch.inference_mode():
+                try:
+                    start = time.time()
+                    generate_text(models, "Describe a video scene in one sentence.", 16)
+                    print(f"LLM warm-up took {time.time() - start:.2f}s")
+                except Exception as e:
+                    print(f"LLM warm-up failed: {e}")
+            return {}
+        
+        def loader():
+            try:
+                print(f"\nLoading LLM model: {model_name}...\n")
+                
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+                
+                # Load tokenizer
+                tokenizer = AutoTokenizer.from_pretrained(
+                    model_id,
+                    trust_remote_code=True
+                )
+                
+                # Set padding token if needed
+                if tokenizer.pad_token is None:
+                    tokenizer.pad_token = tokenizer.eos_token
+                
+                # Load model
+                model = AutoModelForCausalLM.from_pretrained(
+                    model_id,
+                    torch_dtype=torch.float16 if not on_cpu else cpu_inference.get_cpu_dtype(cpu_precision),
+                    device_map="auto",
+                    trust_remote_code=True,
+                )
+                
+                if on_cpu:
+                    model = cpu_inference.prepare_model(model, cpu_precision,
+                                                        check=lambda m: generate_text((tokenizer, m), "Hello"))
+                print(f"LLM model {model_name} loaded successfully!\n")
+                return tokenizer, model
+                
+            except Exception as e:
+                print(f"Failed to load LLM model: {e}")
+                print("\nNote: Some models may require Hugging Face authentication.")
+                print("Try running: huggingface-cli login")
+                return None
+        
+        models = model_registry.get_model(cpu_inference.get_model_key(model_id, self.device, cpu_precision),
+                                          loader, warmup if on_cpu and cpu_warmup else None)
+        return models if models else (None, None)
     
-    def describe_frame(self, image, tokenizer, model):
-        """Generate description for a single frame using Moondream2"""
+    def describe_frame(self, image, tokenizer, model, model_key, use_store=True):
+        """
+        Generate description for a single frame using Moondream2, reusing the caption store for identical frames.
+        Inference holds the lock of model_key, the model's registry key, as other nodes share the model
+        """
         try:
-            enc_image = model.encode_image(image)
+            question = FRAME_QUESTION
+            content_hash = caption_store.image_hash(image)
+            if use_store:
+                caption = caption_store.get_caption(content_hash, MOONDREAM_MODEL_ID, question)
+                if caption is not None:
+                    return caption
             
-            question = "Describe this image in detail, including setting, characters, actions, and mood."
-            with torch.no_grad():
-                answer = model.answer_question(enc_image, question, tokenizer)
+            with model_registry.get_model_lock(model_key), torch.inference_mode():
+                answer = model.answer_question(model.encode_image(image), question, tokenizer)
             
             caption = answer.strip()
             
@@ -271,14 +365,16 @@ class VideoSceneCaption:
                     caption = caption[len(pattern):].lstrip(" :-\n")
                     break
             
-            return caption.strip()
+            caption = caption.strip()
+            caption_store.put_caption(content_hash, MOONDREAM_MODEL_ID, question, caption)
+            return caption
             
         except Exception as e:
             print(f"Error describing frame: {e}")
             return "Unable to describe this frame."
     
-    def summarize_with_llm(self, frame_descriptions, tokenizer, model, max_length=500):
-        """Summarize multiple frame descriptions into a video caption using LLM"""
+    def summarize_with_llm(self, frame_descriptions, tokenizer, model, model_key, max_length=500):
+        """Summarize multiple frame descriptions into a video caption using LLM, holding the lock of model_key"""
         try:
             # Prepare concise prompt with frame descriptions
             descriptions_text = "\n".join([
@@ -311,7 +407,7 @@ Video caption:"""
                 raise ValueError("Prompt too long for model context")
             
             # FIX for Phi-3: Use generate with updated parameters
-            with torch.no_grad():
+            with model_registry.get_model_lock(model_key), torch.inference_mode():
                 # Try different generation methods
                 try:
                     outputs = model.generate(
@@ -468,7 +564,9 @@ Video caption:"""
     
     def generate_captions(self, scene_video_paths, llm_model, sampling_interval,
                          max_frames, max_description_length, selected_scene_index,
-                         use_cache, video_scenes_output_path=""):
+                         use_cache, video_scenes_output_path="", keep_models_loaded=True,
+                         caption_dedup_threshold=frame_dedup.DEFAULT_DEDUP_THRESHOLD, cpu_precision="float32",
+                         cpu_threads=0, cpu_warmup=True, export_metadata_json=True):
         
         print(f"\n{'='*60}")
         print(f"VideoSceneCaption: Starting caption generation")
@@ -544,14 +642,22 @@ Video caption:"""
         debug_info_lines.append(f"Found {len(valid_video_paths)} valid video files")
         
         # Generate cache key
-        cache_key_params = f"{len(valid_video_paths)}_{llm_model}_{sampling_interval}_{max_frames}_{max_description_length}_{base_dir}"
-        cache_key = hashlib.md5(cache_key_params.encode()).hexdigest()[:16]
+        # Videos are identified by content, in order, so moved copies hit the cache and a
+        # different set of clips never does
+        video_fingerprints = []
+        for video_path in valid_video_paths:
+            try:
+                video_fingerprints.append(video_fingerprint.get_fingerprint(video_path))
+            except OSError:
+                video_fingerprints.append(os.path.abspath(video_path))
         
-        cache_file = os.path.join(captions_dir, f"cache_{cache_key}.json")
+        cache_key_params = f"{'-'.join(video_fingerprints)}_{llm_model}_{sampling_interval}_{max_frames}_{max_description_length}_{base_dir}"
+        cache_key = hashlib.md5(cache_key_params.encode()).hexdigest()[:16]
         
         # Check cache
         scene_captions = []
         metadata = {
+            "run_key": cache_key,
             "base_directory": base_dir,
             "captions_directory": captions_dir,
             "llm_model": llm_model,
@@ -563,23 +669,30 @@ Video caption:"""
         }
         
         # Check if we can use cache
-        video_paths_changed = self.last_video_paths != valid_video_paths
         cache_valid = False
         
-        if use_cache and os.path.exists(cache_file) and not video_paths_changed:
+        cached_metadata = scene_catalog.load_run(captions_dir, cache_key) if use_cache else None
+        if cached_metadata:
             try:
-                with open(cache_file, 'r') as f:
-                    cached_data = json.load(f)
-                scene_captions = cached_data.get("scene_captions", [])
-                metadata = cached_data.get("metadata", metadata)
+                # Captions come from the catalog, including edits made since the run
+                metadata = cached_metadata
+                scene_captions = [scene.get("caption", "") for scene in metadata.get("scenes", [])]
                 
-                # Validate cache
-                if len(scene_captions) == len(valid_video_paths):
+                # Validate cache: caption files missing from the manifest are written back from the catalog
+                changed = scene_catalog.find_changed_artifacts(captions_dir, cache_key) or []
+                restored = scene_catalog.restore_descriptions(captions_dir, changed)
+                if restored:
+                    debug_info_lines.append(f"Restored {len(restored)} caption files from the catalog")
+                if len(scene_captions) == len(valid_video_paths) and len(restored) == len(changed):
                     cache_valid = True
+                    # The cached run may have read the same clips from other paths
+                    for scene, video_path in zip(metadata.get("scenes", []), valid_video_paths):
+                        scene["video_path"] = video_path
                     debug_info_lines.append(f"✓ Loaded {len(scene_captions)} cached captions")
                 else:
                     debug_info_lines.append(f"Cache invalid: expected {len(valid_video_paths)} captions, got {len(scene_captions)}")
                     scene_captions = []
+                    metadata = dict(cached_metadata, scenes=[])
             except Exception as e:
                 debug_info_lines.append(f"Error loading cache: {e}")
         
@@ -648,9 +761,13 @@ Video caption:"""
         debug_info_lines.append(f"  Failed URLs: {len(valid_video_paths) - successful_urls}")
         
         if not cache_valid:
+            moondream_key = cpu_inference.get_model_key(MOONDREAM_MODEL_ID, self.device, cpu_precision)
+            llm_key = cpu_inference.get_model_key(LLM_MODEL_IDS.get(llm_model, LLM_MODEL_IDS["phi-3-mini-4k"]),
+                                                  self.device, cpu_precision)
+            
             # Load Moondream2
             debug_info_lines.append(f"\nLoading Moondream2 model...")
-            moondream_tokenizer, moondream_model = self.load_moondream_model()
+            moondream_tokenizer, moondream_model = self.load_moondream_model(cpu_precision, cpu_threads, cpu_warmup)
             if not moondream_model:
                 debug_info_lines.append(f"Failed to load Moondream2 model")
                 print("Failed to load Moondream2 model")
@@ -663,11 +780,18 @@ Video caption:"""
             
             if use_llm:
                 debug_info_lines.append(f"Loading LLM model: {llm_model}...")
-                llm_tokenizer, llm_model_obj = self.load_llm_model(llm_model)
+                llm_tokenizer, llm_model_obj = self.load_llm_model(llm_model, cpu_precision, cpu_threads, cpu_warmup)
                 if not llm_model_obj:
                     debug_info_lines.append("LLM model not available, using smart summarization")
                     use_llm = False
             
+            # Perceptual hashes and descriptions of the frames described so far, near-identical
+            # frames in later scenes reuse these descriptions
+            described_hashes = []
+            described_brightness = []
+            described_frames = []
+            reused_descriptions = 0
+            
             # Process each video
             total_videos = len(valid_video_paths)
             self.create_progress_bar(total_videos, "Generating captions")
@@ -684,7 +808,8 @@ Video caption:"""
                 debug_info_lines.append(f"  Duration: {duration:.2f}s")
                 
                 # Extract keyframes throughout the video
-                frames = self.extract_keyframes(video_path, sampling_interval, max_frames)
+                frames = self.extract_keyframes(video_path, sampling_interval, max_frames,
+                                                index_dir=os.path.join(base_dir, "scene_index"))
                 debug_info_lines.append(f"  Extracted {len(frames)} keyframes")
                 
                 if not frames:
@@ -705,10 +830,27 @@ Video caption:"""
                 
                 # Describe each frame with Moondream2
                 frame_descriptions = []
+                hashes, brightness = frame_dedup.dhash_images([frame_image for _, frame_image in frames])
                 for frame_idx, (timestamp, frame_image) in enumerate(frames):
+                    match = -1
+                    if caption_dedup_threshold > 0:
+                        match = frame_dedup.find_match(hashes[frame_idx], brightness[frame_idx],
+                                                       np.array(described_hashes, dtype=np.uint64),
+                                                       np.array(described_brightness), caption_dedup_threshold)
+                    if match >= 0:
+                        debug_info_lines.append(f"    Frame {frame_idx+1}/{len(frames)} at {timestamp:.1f}s matches an earlier frame")
+                        frame_descriptions.append((timestamp, described_frames[match]))
+                        reused_descriptions += 1
+                        continue
+                    
                     debug_info_lines.append(f"    Describing frame {frame_idx+1}/{len(frames)} at {timestamp:.1f}s...")
-                    description = self.describe_frame(frame_image, moondream_tokenizer, moondream_model)
+                    description = self.describe_frame(frame_image, moondream_tokenizer, moondream_model, moondream_key,
+                                                      use_store=use_cache)
                     frame_descriptions.append((timestamp, description))
+                    if description != "Unable to describe this frame.":
+                        described_hashes.append(hashes[frame_idx])
+                        described_brightness.append(brightness[frame_idx])
+                        described_frames.append(description)
                 
                 # Generate video caption
                 video_caption = ""
@@ -721,6 +863,7 @@ Video caption:"""
                             frame_descriptions, 
                             llm_tokenizer, 
                             llm_model_obj,
+                            llm_key,
                             max_length=max_description_length
                         )
                         method_used = f"llm_{llm_model}"
@@ -769,37 +912,32 @@ Video caption:"""
                 debug_info_lines.append(f"  Caption length: {len(video_caption)} characters")
                 debug_info_lines.append(f"  Saved to: {caption_filepath}")
             
-            # Cache results
-            if use_cache:
-                cache_data = {
-                    "scene_captions": scene_captions,
-                    "metadata": metadata,
-                    "cache_key": cache_key
-                }
-                with open(cache_file, 'w') as f:
-                    json.dump(cache_data, f, indent=2)
-                debug_info_lines.append(f"\n✓ Results cached: {cache_file}")
-            
-            # Clean up models
-            debug_info_lines.append("\nCleaning up models...")
-            if moondream_model:
-                del moondream_model
-                self.moondream_model = None
-                self.moondream_tokenizer = None
-            
-            if llm_model_obj:
-                del llm_model_obj
-                self.llm_model = None
-                self.llm_tokenizer = None
-            
-            torch.cuda.empty_cache()
+            if reused_descriptions:
+                debug_info_lines.append(f"\nCaption dedup: reused descriptions for {reused_descriptions} near-duplicate frames")
+            
+            # Cache results in the scene catalog, which the caption routes also update
+            params = {"llm_model": llm_model, "sampling_interval": sampling_interval, "max_frames": max_frames,
+                      "max_description_length": max_description_length, "video_paths": valid_video_paths}
+            caption_files = [scene["caption_filepath"] for scene in metadata["scenes"] if scene.get("caption_filepath")]
+            if scene_catalog.save_run(captions_dir, cache_key, metadata, params, editable_artifacts=caption_files):
+                debug_info_lines.append(f"\n✓ Results cached: {scene_catalog.get_catalog_path(captions_dir)}")
+            
+            # Models stay loaded in the registry for the next run unless asked otherwise,
+            # only this node's models are unloaded since other nodes share the registry
+            del moondream_model, llm_model_obj
+            if not keep_models_loaded:
+                debug_info_lines.append("\nUnloading models...")
+                model_registry.unload_model(moondream_key)
+                if llm_model != "none":
+                    model_registry.unload_model(llm_key)
         
         # Save metadata
-        metadata_path = os.path.join(captions_dir, "metadata.json")
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
-        
-        debug_info_lines.append(f"\nMetadata saved: {metadata_path}")
+        if export_metadata_json:
+            metadata_path = os.path.join(captions_dir, "metadata.json")
+            with open(metadata_path, 'w') as f:
+                json.dump(metadata, f, indent=2)
+            
+            debug_info_lines.append(f"\nMetadata saved: {metadata_path}")
         
         # Get selected caption
         internal_index = selected_scene_index - 1  # Convert 1-based to 0-based
@@ -1,5 +1,6 @@
 # VideoSceneExtractor.py - Complete implementation with start/end frame extraction
 import os
+import re
 import torch
 import numpy as np
 from PIL import Image
@@ -11,6 +12,13 @@ from typing import List, Tuple
 import warnings
 import subprocess
 import shutil
+import threading
+import queue
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .keyframe_index import (read_frames, load_keyframe_index, has_closed_gops, probe_video_stream,
+                             probe_video_start_offset)
+from . import model_registry, caption_store, frame_dedup, cpu_inference, stage_cache, video_fingerprint, scene_catalog, cache_gc
 warnings.filterwarnings("ignore")
 
 # Import comfy.utils for progress bar
@@ -21,6 +29,148 @@ except ImportError:
     USE_COMFY_PROGRESS = False
     print("Note: comfy.utils not available, using simple progress display")
 
+# PromptServer notifies the UI when a background job finishes
+try:
+    from server import PromptServer
+except ImportError:
+    PromptServer = None
+
+# Background jobs finishing the remaining scenes, keyed by cache key
+_background_jobs = {}
+
+# Longest wait in seconds for the selected scene, or for a background job before the next run
+BACKGROUND_JOB_TIMEOUT = 600
+
+# Target frame heights for scene detection analysis
+ANALYSIS_RESOLUTIONS = {
+    "160p": 160,
+    "320p": 320,
+    "480p": 480,
+}
+
+# Frame signature layout for histogram scene detection
+HISTOGRAM_BINS = [8, 4, 4]  # Hue, saturation, value
+THUMBNAIL_SIZE = 16
+HISTOGRAM_AUTO_WIDTH = 256  # Analysis width of "auto", the same heuristic as PySceneDetect
+
+# Adaptive thresholding: a cut must score ADAPTIVE_RATIO times the mean of
+# the ADAPTIVE_WINDOW scores on either side of it
+ADAPTIVE_RATIO = 3.0
+ADAPTIVE_WINDOW = 2
+
+# Frames per ffmpeg select run, bounds the select expression evaluated for every decoded frame
+FFMPEG_SELECT_BATCH = 500
+
+# Scene boundaries and written frames waiting between stages in streaming pipeline mode
+PIPELINE_QUEUE_SIZE = 8
+
+# Model and prompt used for Moondream2 frame descriptions
+CAPTION_MODEL_ID = "vikhyatk/moondream2"
+CAPTION_QUESTION = "Describe this image in detail."
+
+# Written to the .txt in place of a caption that couldn't be generated
+CAPTION_FAILED_PREFIX = "Caption generation failed: "
+
+# ffmpeg muxer names of the scene video formats, for the segment muxer
+SEGMENT_MUXERS = {
+    "mkv": "matroska",
+}
+
+# Encoders used to re-encode the head of a smart cut clip, by source codec
+SMART_CUT_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "vp9": "libvpx-vp9",
+}
+
+# Intermediate container and extension for smart cut parts. MPEG-TS carries the
+# H.264/HEVC parameter sets in-band, so parts from different encoders can be joined
+SMART_CUT_PART_FORMATS = {
+    "h264": ("mpegts", "ts"),
+    "hevc": ("mpegts", "ts"),
+    "default": ("matroska", "mkv"),
+}
+
+# MP4/MOV sample entries that allow parameter sets to change in-band, the
+# re-encoded parts of a smart cut carry different SPS/PPS than the copied part
+SMART_CUT_INBAND_TAGS = {
+    "h264": "avc3",
+    "hevc": "hev1",
+}
+
+# Keyframe image formats: file extension and PIL save format
+KEYFRAME_FORMATS = {
+    "png": ("png", "PNG"),
+    "jpeg": ("jpg", "JPEG"),
+    "webp": ("webp", "WEBP"),
+    "webp_lossless": ("webp", "WEBP"),
+}
+
+
+class FrameWriter:
+    """
+    Encodes and saves frames on a small thread pool so image encoding overlaps with
+    decoding. At most max_pending frames wait in memory, submit() blocks beyond that.
+    """
+    def __init__(self, keyframe_format="png", keyframe_quality=90, png_compression=6, workers=None):
+        self.extension, self.pil_format = KEYFRAME_FORMATS.get(keyframe_format, KEYFRAME_FORMATS["png"])
+        if keyframe_format == "jpeg":
+            self.save_kwargs = {"quality": keyframe_quality}
+        elif keyframe_format == "webp":
+            self.save_kwargs = {"quality": keyframe_quality, "method": 4}
+        elif keyframe_format == "webp_lossless":
+            self.save_kwargs = {"lossless": True, "quality": keyframe_quality}
+        else:
+            self.save_kwargs = {"compress_level": png_compression}
+        
+        self.keyframe_format = keyframe_format
+        self.keyframe_quality = keyframe_quality
+        self.png_compression = png_compression
+        workers = workers or min(4, os.cpu_count() or 1)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(workers * 2)
+        self.futures = []
+
+    def ffmpeg_args(self):
+        """ffmpeg encoder options producing the same format"""
+        if self.keyframe_format == "jpeg":
+            # Map quality 1-100 onto mjpeg's qscale 31-2
+            return ['-q:v', str(round(31 - (self.keyframe_quality - 1) * 29 / 99))]
+        if self.keyframe_format == "webp":
+            return ['-c:v', 'libwebp', '-quality', str(self.keyframe_quality)]
+        if self.keyframe_format == "webp_lossless":
+            return ['-c:v', 'libwebp', '-lossless', '1']
+        return ['-compression_level', str(self.png_compression)]
+
+    def submit(self, frame, output_path, on_written=None):
+        """Queue a BGR frame to be saved to output_path, on_written(output_path) is called once it is saved"""
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(self.write, frame, output_path, on_written)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda f: self.slots.release())
+        self.futures.append(future)
+
+    def write(self, frame, output_path, on_written=None):
+        """Save a BGR frame as an image file"""
+        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        Image.fromarray(frame_rgb).save(output_path, self.pil_format, **self.save_kwargs)
+        print(f"  Saved: {os.path.basename(output_path)}")
+        if on_written:
+            on_written(output_path)
+
+    def close(self):
+        """Wait for all queued frames to be written"""
+        for future in self.futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Error saving frame: {e}")
+        self.futures = []
+        self.executor.shutdown(wait=True)
+
 class VideoSceneGenerationNode:
     @classmethod
     def INPUT_TYPES(cls):
@@ -105,7 +255,8 @@ class VideoSceneGenerationNode:
                 "scene_detection_method": ([
                     "opencv",
                     "pyscene_openvideo", 
-                    "pyscene_videomanager"
+                    "pyscene_videomanager",
+                    "histogram"
                 ], {
                     "default": "opencv"
                 }),
@@ -118,6 +269,142 @@ class VideoSceneGenerationNode:
                     "default": "",
                     "multiline": True,
                 }),
+            },
+            "optional": {
+                "single_pass_capture": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Single-Pass Capture",
+                    "label_off": "Seek Per Frame"
+                }),
+                "detection_stride": ("INT", {
+                    "default": 5,
+                    "min": 1,
+                    "max": 60,
+                    "step": 1,
+                }),
+                "refine_cuts": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Exact Cut Frames",
+                    "label_off": "Stride Resolution"
+                }),
+                "analysis_resolution": ([  # auto: full for OpenCV, each detector's own default otherwise
+                    "auto",
+                    "160p",
+                    "320p",
+                    "480p",
+                    "full"
+                ], {
+                    "default": "auto"
+                }),
+                "detection_workers": ("INT", {  # 0 = one per CPU core
+                    "default": 1,
+                    "min": 0,
+                    "max": 64,
+                    "step": 1,
+                }),
+                "adaptive_threshold": ("BOOLEAN", {  # Histogram detection only
+                    "default": False,
+                    "label_on": "Adaptive Threshold",
+                    "label_off": "Fixed Threshold"
+                }),
+                "frame_extractor": ([  # ffmpeg falls back to OpenCV when not installed
+                    "ffmpeg",
+                    "opencv"
+                ], {
+                    "default": "ffmpeg"
+                }),
+                "keyframe_format": ([
+                    "png",
+                    "jpeg",
+                    "webp",
+                    "webp_lossless"
+                ], {
+                    "default": "png"
+                }),
+                "keyframe_quality": ("INT", {  # JPEG/WebP quality
+                    "default": 90,
+                    "min": 1,
+                    "max": 100,
+                    "step": 1,
+                }),
+                "png_compression": ("INT", {
+                    "default": 6,
+                    "min": 0,
+                    "max": 9,
+                    "step": 1,
+                }),
+                "video_export_mode": ([
+                    "per_scene",
+                    "single_pass",
+                    "smart_cut"
+                ], {
+                    "default": "per_scene"
+                }),
+                "video_export_workers": ("INT", {  # 0 = auto
+                    "default": 0,
+                    "min": 0,
+                    "max": 16,
+                    "step": 1,
+                }),
+                "video_export_retries": ("INT", {
+                    "default": 1,
+                    "min": 0,
+                    "max": 5,
+                    "step": 1,
+                }),
+                "caption_batch_size": ("INT", {
+                    "default": 4,
+                    "min": 1,
+                    "max": 64,
+                    "step": 1,
+                }),
+                "keep_models_loaded": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Keep Models Loaded",
+                    "label_off": "Unload After Run"
+                }),
+                "caption_dedup_threshold": ("INT", {
+                    "default": frame_dedup.DEFAULT_DEDUP_THRESHOLD,
+                    "min": 0,
+                    "max": 16,
+                    "step": 1,
+                }),
+                "pipeline_mode": (["phased", "streaming"], {
+                    "default": "phased"
+                }),
+                "selected_scene_first": ("BOOLEAN", {
+                    "default": False,
+                    "label_on": "Selected Scene First",
+                    "label_off": "All Scenes First"
+                }),
+                "cpu_precision": (cpu_inference.CPU_PRECISIONS, {
+                    "default": "float32"
+                }),
+                "cpu_threads": ("INT", {
+                    "default": 0,
+                    "min": 0,
+                    "max": 256,
+                    "step": 1,
+                }),
+                "cpu_warmup": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Warm Up And Measure",
+                    "label_off": "No Warm-up"
+                }),
+                "export_metadata_json": ("BOOLEAN", {
+                    "default": True,
+                    "label_on": "Write metadata.json",
+                    "label_off": "Catalog Only"
+                }),
+                "cache_budget_gb": ("FLOAT", {
+                    "default": 0.0,
+                    "min": 0.0,
+                    "max": 10000.0,
+                    "step": 0.5,
+                }),
+            },
+            "hidden": {
+                "unique_id": "UNIQUE_ID",
             }
         }
 
@@ -133,10 +420,13 @@ class VideoSceneGenerationNode:
         self.progress_bar = None
         self.last_video_file = None
         self.last_index = None
+        # Background jobs report progress in the console, ComfyUI's bar belongs to the running node
+        self.comfy_progress = USE_COMFY_PROGRESS
+        self.background_job = None
         
     def create_progress_bar(self, total, desc=""):
         """Create a progress bar"""
-        if USE_COMFY_PROGRESS:
+        if self.comfy_progress:
             self.progress_bar = comfy.utils.ProgressBar(total)
             print(f"{desc} (0/{total})")
         else:
@@ -157,7 +447,7 @@ class VideoSceneGenerationNode:
         
     def update_progress(self, current, total, desc=""):
         """Update progress bar"""
-        if USE_COMFY_PROGRESS and self.progress_bar:
+        if self.comfy_progress and self.progress_bar:
             self.progress_bar.update(1)
             if current == total:
                 print(f"{desc}: Complete! ({current}/{total})")
@@ -169,32 +459,38 @@ class VideoSceneGenerationNode:
                      max_description_length, save_scenes, generate_descriptions, 
                      output_dir, scene_detection_method, extract_end_frames,
                      extract_scene_videos, scene_video_format, video_codec, 
-                     audio_codec, video_quality):
-        """Generate a unique cache key based on input parameters"""
-        params_str = (f"{video_file}_{start_time}_{end_time}_{scene_threshold}_"
+                     audio_codec, video_quality, detection_stride=5, refine_cuts=True,
+                     analysis_resolution="auto", adaptive_threshold=False, keyframe_format="png",
+                     keyframe_quality=90, png_compression=6):
+        """
+        Generate a unique cache key based on input parameters. The video is identified by
+        its content fingerprint, so renamed or moved copies of it find the same cache.
+        """
+        params_str = (f"{self.get_video_hash(video_file)}_{start_time}_{end_time}_{scene_threshold}_"
                      f"{max_description_length}_{save_scenes}_{generate_descriptions}_"
                      f"{output_dir}_{scene_detection_method}_{extract_end_frames}_"
                      f"{extract_scene_videos}_{scene_video_format}_{video_codec}_"
-                     f"{audio_codec}_{video_quality}")
+                     f"{audio_codec}_{video_quality}_{detection_stride}_{refine_cuts}_"
+                     f"{analysis_resolution}_{adaptive_threshold}_{keyframe_format}_"
+                     f"{keyframe_quality}_{png_compression}")
         return hashlib.md5(params_str.encode()).hexdigest()[:16]
     
     def load_cached_results(self, cache_key, scene_output_dir):
-        """Load cached results if they exist"""
-        cache_file = os.path.join(scene_output_dir, f"cache_{cache_key}.json")
-        
-        if not os.path.exists(cache_file):
-            print(f"Cache file not found: {cache_file}")
+        """Load the results of a run with the same key from the output directory's scene catalog"""
+        metadata = scene_catalog.load_run(scene_output_dir, cache_key)
+        if metadata is None:
+            print(f"No cached run in the scene catalog for key {cache_key}")
             return None
-            
+        
         try:
-            with open(cache_file, 'r') as f:
-                cache_data = json.load(f)
-            
-            print(f"Found cache file: {cache_file}")
+            scenes = metadata.get("scenes", [])
+            scene_paths = [scene["start_frame"]["image_path"] for scene in scenes]
+            scene_end_paths = [scene["end_frame"]["image_path"] for scene in scenes if "end_frame" in scene]
+            scene_video_paths = []
+            if metadata.get("extract_scene_videos"):
+                scene_video_paths = [scene.get("video_path", "") for scene in scenes]
             
-            scene_paths = cache_data.get("scene_paths", [])
-            scene_end_paths = cache_data.get("scene_end_paths", [])
-            scene_video_paths = cache_data.get("scene_video_paths", [])
+            print(f"Found cached run in scene catalog: {cache_key}")
             
             if not scene_paths:
                 print("Cache has no scene paths")
@@ -206,46 +502,157 @@ class VideoSceneGenerationNode:
             if scene_video_paths:
                 print(f"Cache has {len(scene_video_paths)} scene videos")
             
-            # Check if the first scene file exists
-            first_scene = scene_paths[0] if scene_paths else None
-            if first_scene and not os.path.exists(first_scene):
-                print(f"First scene file missing: {first_scene}")
-                print("Cache invalid, regenerating...")
+            # Every frame, clip and description is checked against the run's manifest,
+            # description files the catalog still knows are written back instead of regenerated
+            changed = scene_catalog.find_changed_artifacts(scene_output_dir, cache_key)
+            if changed is None:
+                changed = [path for path in scene_paths[:1] if not os.path.exists(path)]
+            restored = scene_catalog.restore_descriptions(scene_output_dir,
+                                                          [path for path in changed if path.endswith('.txt')])
+            if restored:
+                print(f"Restored {len(restored)} description files from the catalog")
+                changed = [path for path in changed if path not in restored]
+            if changed:
+                print(f"{len(changed)} cached outputs missing or changed (e.g. {os.path.basename(changed[0])})")
+                print("Cache invalid, regenerating the missing outputs...")
+                return None
+            
+            failed = [scene[frame]["image_path"] for scene in scenes for frame in ("start_frame", "end_frame")
+                      if str(scene.get(frame, {}).get("description", "")).startswith(CAPTION_FAILED_PREFIX)]
+            if failed:
+                print(f"{len(failed)} cached captions failed (e.g. {os.path.basename(failed[0])}), regenerating them...")
                 return None
             
             print("Cache validation passed!")
-            return cache_data
+            return {
+                "scene_paths": scene_paths,
+                "scene_end_paths": scene_end_paths,
+                "scene_video_paths": scene_video_paths,
+                "scene_timestamps": [scene["start_timestamp"] for scene in scenes],
+                "scene_end_timestamps": [scene["end_timestamp"] for scene in scenes],
+                "metadata": metadata,
+            }
             
         except Exception as e:
             print(f"Error loading cache: {e}")
             return None
     
-    def save_cached_results(self, cache_key, scene_output_dir, results):
-        """Save results to cache"""
-        cache_file = os.path.join(scene_output_dir, f"cache_{cache_key}.json")
+    def save_cached_results(self, cache_key, scene_output_dir, metadata, params=None):
+        """
+        Store the run's scenes, frames, clips and descriptions in the scene catalog,
+        with a manifest of the files so a cached run can be fully validated
+        """
+        artifacts = []
+        description_paths = []
+        for scene in metadata.get("scenes", []):
+            for frame in (scene.get("start_frame"), scene.get("end_frame")):
+                if frame:
+                    artifacts.append(frame["image_path"])
+                    if frame.get("description_path") and os.path.exists(frame["description_path"]):
+                        description_paths.append(frame["description_path"])
+            if scene.get("video_path"):
+                artifacts.append(scene["video_path"])
         
-        try:
-            cache_data = {
-                "scene_paths": results.get("scene_paths", []),
-                "scene_end_paths": results.get("scene_end_paths", []),
-                "scene_video_paths": results.get("scene_video_paths", []),
-                "scene_timestamps": results.get("scene_timestamps", []),
-                "scene_end_timestamps": results.get("scene_end_timestamps", []),
-                "metadata": results.get("metadata", {}),
-                "cache_key": cache_key,
-                "video_file": results.get("video_file", ""),
-                "output_dir": results.get("output_dir", ""),
-            }
-            
-            with open(cache_file, 'w') as f:
-                json.dump(cache_data, f, indent=2)
-                
-            print(f"Results cached to: {cache_file}")
+        if scene_catalog.save_run(scene_output_dir, cache_key, metadata, params, metadata.get("video_file"),
+                                  artifacts, description_paths):
+            print(f"Results cached to: {scene_catalog.get_catalog_path(scene_output_dir)}")
             print(f"Cache key: {cache_key}")
-            
-        except Exception as e:
-            print(f"Error saving cache: {e}")
     
+    def save_detection_stage(self, scene_output_dir, detection_key, scene_timestamps, scene_end_timestamps,
+                             use_cache=True):
+        """Save detected scenes, a run that found none (e.g. a failed read) is not kept"""
+        if use_cache and scene_timestamps:
+            stage_cache.save_stage(scene_output_dir, "detection", detection_key, {
+                "scene_timestamps": scene_timestamps,
+                "scene_end_timestamps": scene_end_timestamps,
+            })
+    
+    def load_progress(self, progress_path):
+        """Load the completion records of an interrupted or finished run"""
+        progress = {"frames": {}, "clips": {}, "descriptions": {}}
+        if os.path.exists(progress_path):
+            try:
+                with open(progress_path, 'r') as f:
+                    progress.update(json.load(f))
+                progress["resumed"] = True
+                print(f"Resuming from {progress_path}: {len(progress['frames'])} frames, "
+                      f"{len(progress['clips'])} clips, {len(progress['descriptions'])} descriptions done")
+            except Exception as e:
+                print(f"Error loading progress: {e}")
+        return progress
+
+    def save_progress(self, progress_path, progress):
+        """Write the completion records, replacing the file atomically"""
+        try:
+            temp_path = progress_path + ".tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(progress, f)
+            os.replace(temp_path, progress_path)
+        except Exception as e:
+            print(f"Error saving progress: {e}")
+
+    def record_output(self, progress, kind, path):
+        """Record a finished output with its size"""
+        if path and os.path.exists(path):
+            progress[kind][os.path.basename(path)] = os.path.getsize(path)
+
+    def is_output_complete(self, progress, kind, path, expected_duration=None):
+        """
+        Check whether an output from an earlier run can be kept. Recorded outputs only
+        need a matching size, unrecorded ones (written just before a crash) are probed
+        when resuming. Without a progress file they may come from a run with other
+        settings that wrote the same file names, so they are redone, as are frames and
+        clips whose size no longer matches the record. Descriptions may have been edited.
+        """
+        if not os.path.exists(path):
+            return False
+        
+        size = os.path.getsize(path)
+        recorded_size = progress[kind].get(os.path.basename(path))
+        if recorded_size == size:
+            return True
+        if size == 0 or not progress.get("resumed") or (recorded_size is not None and kind != "descriptions"):
+            return False
+        
+        if kind == "frames":
+            valid = self.is_valid_image(path)
+        elif kind == "clips":
+            valid = self.is_valid_clip(path, expected_duration)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read().strip()
+            valid = bool(text) and not text.startswith(CAPTION_FAILED_PREFIX)
+        
+        if valid:
+            progress[kind][os.path.basename(path)] = size
+        return valid
+
+    def is_valid_image(self, image_path):
+        """Check that an image file is complete"""
+        try:
+            with Image.open(image_path) as image:
+                image.verify()
+            return True
+        except Exception:
+            return False
+
+    def is_valid_clip(self, video_path, expected_duration=None):
+        """Check that a video file opens and roughly has the expected duration"""
+        if not expected_duration or expected_duration <= 0:
+            return True
+        
+        cap = cv2.VideoCapture(video_path)
+        try:
+            if not cap.isOpened():
+                return False
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_count = cap.get(cv2.CAP_PROP_FRAME_COUNT)
+            if fps <= 0 or frame_count <= 0:
+                return False
+            return abs(frame_count / fps - expected_duration) <= max(0.5, expected_duration * 0.1)
+        finally:
+            cap.release()
+
     def check_ffmpeg(self):
         """Check if ffmpeg is available"""
         try:
@@ -265,13 +672,15 @@ class VideoSceneGenerationNode:
             return False
     
     def extract_scene_video(self, video_file, start_time, end_time, output_path, 
-                           video_codec, audio_codec, video_quality, format):
+                           video_codec, audio_codec, video_quality, format, threads=None, start_offset=0.0):
         """
         Extract a scene video using ffmpeg
         Args:
             start_time: Start time in seconds
             end_time: End time in seconds
             output_path: Output video path
+            threads: Optional encoder thread limit, used when several exports run at once
+            start_offset: Seconds from the container start to the first video frame
         """
         try:
             # Calculate duration
@@ -281,29 +690,18 @@ class VideoSceneGenerationNode:
             cmd = [
                 'ffmpeg',
                 '-y',  # Overwrite output file
-                '-ss', str(start_time),  # Start time
+                '-ss', f"{start_time + start_offset:.6f}",  # Start time, relative to the container start
                 '-i', video_file,  # Input file
                 '-t', str(duration),  # Duration
-                '-c:v', video_codec,  # Video codec
-                '-c:a', audio_codec,  # Audio codec
             ]
-            
-            # Add quality parameters for certain codecs
-            if video_codec in ['libx264', 'h264_nvenc']:
-                cmd.extend(['-crf', str(video_quality)])
-            elif video_codec in ['libx265', 'hevc_nvenc']:
-                cmd.extend(['-crf', str(video_quality)])
-            elif video_codec == 'vp9':
-                cmd.extend(['-b:v', '0', '-crf', str(video_quality)])
-            elif video_codec == 'copy':
-                # No quality parameter for copy codec
-                pass
+            cmd.extend(self.get_encoder_args(video_codec, audio_codec, video_quality, format))
             
             # Add format-specific options
             if format == 'mp4':
                 cmd.extend(['-movflags', '+faststart'])
-            elif format == 'webm':
-                cmd.extend(['-deadline', 'good', '-cpu-used', '0'])
+            
+            if threads:
+                cmd.extend(['-threads', str(threads)])
             
             # Add output file
             cmd.append(output_path)
@@ -325,67 +723,584 @@ class VideoSceneGenerationNode:
             print(f"Error extracting scene video: {e}")
             return False
     
-    def load_moondream_model(self):
-        """Load Moondream2 model"""
+    def get_encoder_args(self, video_codec, audio_codec, video_quality, format):
+        """ffmpeg codec and quality arguments for scene video export"""
+        args = [
+            '-c:v', video_codec,  # Video codec
+            '-c:a', audio_codec,  # Audio codec
+        ]
+        
+        # Add quality parameters for certain codecs
+        if video_codec in ['libx264', 'h264_nvenc']:
+            args.extend(['-crf', str(video_quality)])
+        elif video_codec in ['libx265', 'hevc_nvenc']:
+            args.extend(['-crf', str(video_quality)])
+        elif video_codec == 'vp9':
+            args.extend(['-b:v', '0', '-crf', str(video_quality)])
+        elif video_codec == 'copy':
+            # No quality parameter for copy codec
+            pass
+        
+        if format == 'webm':
+            args.extend(['-deadline', 'good', '-cpu-used', '0'])
+        
+        return args
+
+    def export_scene_videos_segmented(self, video_file, jobs, video_codec, audio_codec, video_quality, format,
+                                      index_dir=None):
+        """
+        Export all scene videos with one ffmpeg run using the segment muxer, so the
+        source is read once. Re-encoded exports force a keyframe at every cut so the
+        segments split exactly there; with copy the segments can only split on the
+        source's keyframes, so copy is only used when every scene starts on one.
+        Args:
+            jobs: List of (start_time, end_time, output_path) in seconds, consecutive scenes
+            index_dir: Directory of the keyframe index, checked for copy exports
+        Returns:
+            Output paths in job order, or None if the segments could not be produced
+        """
+        # A zero-length scene (e.g. the closing timestamp at the end of the range) has no segment
+        all_jobs = jobs
+        empty_jobs = [job for job in jobs if job[1] <= job[0]]
+        jobs = [job for job in jobs if job[1] > job[0]]
+        if not jobs:
+            return None
+        
+        fps = self.get_video_fps(video_file)
+        if video_codec == 'copy':
+            keyframes = set(load_keyframe_index(video_file, index_dir) or [])
+            off_keyframe = [start_time for start_time, _, _ in jobs
+                            if self.get_frame_number(start_time, fps) not in keyframes]
+            if off_keyframe:
+                print(f"{len(off_keyframe)} scenes do not start on a keyframe (first at {off_keyframe[0]:.2f}s), "
+                      f"copy segments would be cut at the wrong frames")
+                return None
+        
+        # Input seeking counts from the container start, scene times from the first video frame
+        start_offset = probe_video_start_offset(video_file)
+        range_start = jobs[0][0]
+        range_end = jobs[-1][1]
+        # Output timestamps start at 0 after input seeking. Segments (and forced keyframes)
+        # start at the first frame at or after each time, half a frame early absorbs rounding
+        cut_times = ",".join(f"{max(0.0, start_time - range_start - 0.5 / fps):.6f}" for start_time, _, _ in jobs[1:])
+        videos_dir = os.path.dirname(jobs[0][2])
+        segment_pattern = os.path.join(videos_dir, f".segment_{os.getpid()}_%05d.{format}")
+        
+        cmd = [
+            'ffmpeg', '-y',
+            '-ss', f"{range_start + start_offset:.6f}",
+            '-i', video_file,
+            '-t', str(range_end - range_start),
+        ]
+        cmd.extend(self.get_encoder_args(video_codec, audio_codec, video_quality, format))
+        if video_codec != 'copy' and cut_times:
+            cmd.extend(['-force_key_frames', cut_times])
+        cmd.extend(['-f', 'segment', '-reset_timestamps', '1', '-segment_format', SEGMENT_MUXERS.get(format, format)])
+        if cut_times:
+            cmd.extend(['-segment_times', cut_times])
+        if format == 'mp4':
+            cmd.extend(['-segment_format_options', 'movflags=+faststart'])
+        cmd.append(segment_pattern)
+        
+        print(f"Exporting {len(jobs)} scene videos in a single ffmpeg pass")
+        print(f"FFmpeg command: {' '.join(cmd)}")
+        self.create_progress_bar(len(jobs), "Extracting scene videos")
+        
+        segment_paths = [segment_pattern % i for i in range(len(jobs))]
         try:
-            print(f"\nLoading Moondream2 model: vikhyatk/moondream2\n")
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"✗ FFmpeg error: {result.stderr}")
+                return None
             
-            from transformers import AutoModelForCausalLM, AutoTokenizer
+            # Cuts closer together than the source's keyframe spacing produce fewer segments
+            produced = [path for path in segment_paths if os.path.exists(path)]
+            if len(produced) != len(jobs) or os.path.exists(segment_pattern % len(jobs)):
+                print(f"✗ Expected {len(jobs)} segments, got {len(produced)}")
+                return None
             
-            tokenizer = AutoTokenizer.from_pretrained(
-                "vikhyatk/moondream2", 
-                trust_remote_code=True
-            )
+            video_paths = {}
+            for i, (segment_path, (_, _, output_path)) in enumerate(zip(segment_paths, jobs)):
+                os.replace(segment_path, output_path)
+                video_paths[output_path] = output_path
+                print(f"✓ Scene video saved: {output_path}")
+                self.update_progress(i + 1, len(jobs), f"Extracting video {i+1}/{len(jobs)}")
             
-            model = AutoModelForCausalLM.from_pretrained(
-                "vikhyatk/moondream2",
-                trust_remote_code=True,
-                dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-            ).to(self.device)
+            for start_time, end_time, output_path in empty_jobs:
+                if self.extract_scene_video(video_file, start_time, end_time, output_path,
+                                            video_codec, audio_codec, video_quality, format,
+                                            start_offset=start_offset):
+                    video_paths[output_path] = output_path
             
-            model.eval()
-            print("Model loaded successfully!\n")
-            return tokenizer, model
+            return [video_paths.get(output_path, "") for _, _, output_path in all_jobs]
             
         except Exception as e:
-            print(f"Failed to load model: {e}")
-            return None, None
+            print(f"Error exporting scene videos: {e}")
+            return None
+        finally:
+            for path in segment_paths + [segment_pattern % len(jobs)]:
+                if os.path.exists(path):
+                    os.remove(path)
 
-    def generate_caption(self, image_path, tokenizer, model):
-        """Generate caption using Moondream2"""
-        try:
-            image = Image.open(image_path).convert("RGB")
-            enc_image = model.encode_image(image)
+    def get_smart_cut_exporter(self, video_file, index_dir=None):
+        """
+        Get an export function for extract_scene_video_smart, or None when the source
+        can't be smart cut (no keyframe index or unsupported codec)
+        """
+        keyframes = load_keyframe_index(video_file, index_dir)
+        codec_name, pix_fmt = probe_video_stream(video_file)
+        if not keyframes or codec_name not in SMART_CUT_ENCODERS:
+            print(f"Smart cut not available for this source (codec: {codec_name}), using stream copy")
+            return None
+        
+        start_offset = probe_video_start_offset(video_file)
+        if not has_closed_gops(video_file, index_dir):
+            # Copied GOPs are counted in packets, leading pictures of open GOPs would shift the cut
+            video_codec = "vp9" if codec_name == "vp9" else SMART_CUT_ENCODERS[codec_name]
+            print(f"Smart cut: the source has open GOPs, re-encoding scenes with {video_codec}")
+            
+            def reencode(video_file, start_time, end_time, output_path, _video_codec, audio_codec,
+                         video_quality, format, threads=None):
+                return self.extract_scene_video(video_file, start_time, end_time, output_path, video_codec,
+                                                audio_codec, video_quality, format, threads, start_offset)
+            return reencode
+        
+        print(f"Smart cut: {len(keyframes)} keyframes, re-encoding partial GOPs with {SMART_CUT_ENCODERS[codec_name]}")
+        fps = self.get_video_fps(video_file)
+        
+        def export(video_file, start_time, end_time, output_path, video_codec, audio_codec,
+                   video_quality, format, threads=None):
+            return self.extract_scene_video_smart(video_file, start_time, end_time, output_path, audio_codec,
+                                                  video_quality, format, keyframes, fps, codec_name, pix_fmt,
+                                                  threads, start_offset)
+        return export
+
+    def extract_scene_video_smart(self, video_file, start_time, end_time, output_path, audio_codec,
+                                  video_quality, format, keyframes, fps, codec_name, pix_fmt=None, threads=None,
+                                  start_offset=0.0):
+        """
+        Frame-exact copy export: the partial GOPs at the head and tail of the clip are
+        re-encoded, the whole GOPs in between are stream-copied, and the parts are
+        concatenated. Audio is re-cut from the source over the whole clip.
+        Args:
+            keyframes: Sorted keyframe frame numbers of the source
+            codec_name: Source video codec, selects the encoder for the re-encoded parts
+            start_offset: Seconds from the container start to the first video frame, added to every seek
+        """
+        start_frame = self.get_frame_number(start_time, fps)
+        end_frame = max(start_frame + 1, self.get_frame_number(end_time, fps))
+        # Whole GOPs between the first and last keyframe inside the clip are copied
+        copy_start = next((k for k in keyframes if k >= start_frame), end_frame)
+        copy_start = min(copy_start, end_frame)
+        copy_end = max([k for k in keyframes if copy_start <= k <= end_frame] or [copy_start])
+        
+        part_format, part_ext = SMART_CUT_PART_FORMATS.get(codec_name, SMART_CUT_PART_FORMATS["default"])
+        base_path = os.path.splitext(output_path)[0]
+        list_path = f"{base_path}.parts.txt"
+        parts = []
+        
+        def write_part(name, first_frame, frame_count, copy):
+            part_path = f"{base_path}.{name}.{part_ext}"
+            parts.append(part_path)
+            # Copies seek half a frame past the keyframe, which still lands on it
+            seek_time = ((first_frame + 0.5) / fps if copy else first_frame / fps) + start_offset
+            cmd = [
+                'ffmpeg', '-y', '-v', 'error',
+                '-ss', f"{seek_time:.6f}",
+                '-i', video_file,
+                '-map', '0:v:0',
+                # Whole GOPs hold the same frames in decode and presentation order
+                '-frames:v', str(frame_count),
+            ]
+            if copy:
+                cmd.extend(['-c:v', 'copy'])
+            else:
+                cmd.extend(['-c:v', SMART_CUT_ENCODERS[codec_name], '-crf', str(video_quality)])
+                if codec_name == "vp9":
+                    cmd.extend(['-b:v', '0'])
+                if pix_fmt:
+                    cmd.extend(['-pix_fmt', pix_fmt])
+                if threads:
+                    cmd.extend(['-threads', str(threads)])
+            cmd.extend(['-f', part_format, part_path])
             
-            question = "Describe this image in detail."
-            with torch.no_grad():
-                answer = model.answer_question(enc_image, question, tokenizer)
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"✗ FFmpeg error (smart cut {name}): {result.stderr}")
+                return False
+            return True
+        
+        try:
+            if copy_start > start_frame and not write_part("head", start_frame, copy_start - start_frame, False):
+                return False
+            if copy_end > copy_start and not write_part("copy", copy_start, copy_end - copy_start, True):
+                return False
+            if end_frame > copy_end and not write_part("tail", copy_end, end_frame - copy_end, False):
+                return False
             
-            caption = answer.strip()
+            with open(list_path, 'w') as f:
+                for part in parts:
+                    f.write(f"file '{os.path.abspath(part)}'\n")
             
-            # Clean up
-            patterns_to_remove = [
-                question,
-                f"{question}:",
-                f"Question: {question}",
-                f"Q: {question}",
+            cmd = [
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-ss', f"{start_frame / fps + start_offset:.6f}",
+                '-t', f"{(end_frame - start_frame) / fps:.6f}",
+                '-i', video_file,
+                '-map', '0:v:0', '-map', '1:a?',
+                '-c:v', 'copy',
+                '-c:a', audio_codec,
             ]
+            if format in ('mp4', 'mov') and codec_name in SMART_CUT_INBAND_TAGS:
+                cmd.extend(['-tag:v', SMART_CUT_INBAND_TAGS[codec_name]])
+            if format == 'mp4':
+                cmd.extend(['-movflags', '+faststart'])
+            cmd.append(output_path)
             
-            for pattern in patterns_to_remove:
-                if caption.lower().startswith(pattern.lower()):
-                    caption = caption[len(pattern):].lstrip(" :-")
-                    break
-            
-            if caption.lower().startswith("answer:"):
-                caption = caption[7:].strip()
-            elif caption.lower().startswith("a:"):
-                caption = caption[2:].strip()
+            reencoded = (copy_start - start_frame) + (end_frame - copy_end)
+            print(f"Smart cut scene video: {start_time:.2f}s to {end_time:.2f}s "
+                  f"({reencoded} re-encoded, {copy_end - copy_start} copied frames)")
+            result = subprocess.run(cmd, capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"✗ FFmpeg error (smart cut concat): {result.stderr}")
+                return False
             
-            return caption.strip()
+            print(f"✓ Scene video saved: {output_path}")
+            return True
             
         except Exception as e:
-            print(f"Error generating caption: {e}")
-            return f"Caption generation failed: {str(e)}"
+            print(f"Error smart cutting scene video: {e}")
+            return False
+        finally:
+            for path in parts + [list_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def get_export_workers(self, video_codec, workers=0):
+        """Number of concurrent ffmpeg exports, 0 picks one suited to the codec"""
+        if workers > 0:
+            return workers
+        if video_codec.endswith('_nvenc'):
+            # Consumer GPUs only allow a few concurrent NVENC sessions
+            return 2
+        if video_codec == 'copy':
+            return 4
+        return max(1, min(8, (os.cpu_count() or 2) // 2))
+
+    def export_scene_videos(self, video_file, jobs, video_codec, audio_codec, video_quality, format,
+                            workers=0, retries=1, export_function=None, on_complete=None):
+        """
+        Export scene videos on a pool of concurrent ffmpeg processes
+        Args:
+            jobs: List of (start_time, end_time, output_path) in seconds
+            workers: Maximum concurrent ffmpeg processes, 0 = auto
+            retries: Extra attempts for a failed export
+            export_function: Replaces extract_scene_video, called with the same arguments
+            on_complete: Called with the output path of each successful export
+        Returns:
+            Output paths in job order, "" for exports that failed
+        """
+        if export_function is None:
+            export_function = functools.partial(self.extract_scene_video,
+                                                start_offset=probe_video_start_offset(video_file))
+        workers = min(self.get_export_workers(video_codec, workers), len(jobs))
+        # Share the CPU between concurrent software encoders instead of oversubscribing it
+        threads = None
+        if workers > 1 and video_codec not in ('copy', 'h264_nvenc', 'hevc_nvenc'):
+            threads = max(1, (os.cpu_count() or workers) // workers)
+        
+        print(f"Exporting {len(jobs)} scene videos with {workers} concurrent ffmpeg process(es)")
+        self.create_progress_bar(len(jobs), "Extracting scene videos")
+        
+        def export(job):
+            start_time, end_time, output_path = job
+            for attempt in range(retries + 1):
+                if attempt:
+                    print(f"Retrying scene video ({attempt}/{retries}): {os.path.basename(output_path)}")
+                if export_function(video_file, start_time, end_time, output_path, video_codec,
+                                   audio_codec, video_quality, format, threads):
+                    return output_path
+            return ""
+        
+        video_paths = [""] * len(jobs)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = {executor.submit(export, job): i for i, job in enumerate(jobs)}
+            for completed, future in enumerate(as_completed(futures), 1):
+                i = futures[future]
+                try:
+                    video_paths[i] = future.result()
+                    if video_paths[i] and on_complete:
+                        on_complete(video_paths[i])
+                except Exception as e:
+                    print(f"Error exporting scene video {i}: {e}")
+                self.update_progress(completed, len(jobs), f"Extracting video {completed}/{len(jobs)}")
+        
+        failed = video_paths.count("")
+        if failed:
+            print(f"✗ {failed} of {len(jobs)} scene videos failed")
+        
+        return video_paths
+
+    def load_moondream_model(self, cpu_precision="float32", cpu_threads=0, cpu_warmup=True):
+        """
+        Load Moondream2 model, shared with the other scene nodes through the model registry.
+        On CPU the model is loaded in cpu_precision and, with cpu_warmup, captions a fixed
+        fixture once after loading to warm up and measure captions/s.
+        """
+        on_cpu = self.device.type != "cuda"
+        if on_cpu:
+            cpu_inference.configure_threads(cpu_threads)
+        
+        def caption_image(models, image):
+            tokenizer, model = models
+            return model.answer_question(model.encode_image(image), CAPTION_QUESTION, tokenizer)
+        
+        def loader():
+            try:
+                print(f"\nLoading Moondream2 model: vikhyatk/moondream2\n")
+                
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+                
+                tokenizer = AutoTokenizer.from_pretrained(
+                    "vikhyatk/moondream2", 
+                    trust_remote_code=True
+                )
+                
+                model = AutoModelForCausalLM.from_pretrained(
+                    "vikhyatk/moondream2",
+                    trust_remote_code=True,
+                    dtype=torch.float16 if not on_cpu else cpu_inference.get_cpu_dtype(cpu_precision),
+                ).to(self.device)
+                
+                model.eval()
+                if on_cpu:
+                    fixture = cpu_inference.fixture_images(1)[0]
+                    model = cpu_inference.prepare_model(model, cpu_precision,
+                                                        check=lambda m: caption_image((tokenizer, m), fixture))
+                print("Model loaded successfully!\n")
+                return tokenizer, model
+                
+            except Exception as e:
+                print(f"Failed to load model: {e}")
+                return None
+        
+        warmup = cpu_inference.throughput_warmup(caption_image) if on_cpu and cpu_warmup else None
+        models = model_registry.get_model(cpu_inference.get_model_key(CAPTION_MODEL_ID, self.device, cpu_precision),
+                                          loader, warmup)
+        return models if models else (None, None)
+
+    def truncate_caption(self, caption, max_length=0):
+        """Shorten a caption to max_length characters at a word boundary, 0 keeps it whole"""
+        if max_length and len(caption) > max_length:
+            caption = caption[:max_length].rsplit(' ', 1)[0] + "..."
+        return caption
+
+    def group_similar_images(self, image_paths, threshold):
+        """
+        Group near-identical images by perceptual hash (dHash) so only one image per
+        group needs a caption. Returns {representative path: [paths in the group]} in
+        input order; every image is its own group when threshold is 0.
+        """
+        groups = {path: [path] for path in image_paths}
+        if threshold <= 0 or len(image_paths) < 2:
+            return groups
+        
+        hashes, brightness, valid = frame_dedup.dhash_files(image_paths)
+        valid_indices = [i for i, ok in enumerate(valid) if ok]
+        assignments = frame_dedup.cluster_hashes(hashes[valid_indices], brightness[valid_indices], threshold)
+        
+        for position, representative in enumerate(assignments):
+            if representative != position:
+                path = image_paths[valid_indices[position]]
+                groups[image_paths[valid_indices[representative]]].append(path)
+                del groups[path]
+        
+        duplicates = len(image_paths) - len(groups)
+        if duplicates:
+            print(f"Caption dedup: {duplicates} of {len(image_paths)} images are near-duplicates, "
+                  f"captioning {len(groups)}")
+        return groups
+
+    def iter_image_batches(self, image_paths, batch_size):
+        """
+        Load and convert images on a background thread while the model works on the
+        previous batch. Yields lists of (image_path, PIL image or the loading exception).
+        """
+        batches = queue.Queue(maxsize=2)
+        
+        def load_images():
+            batch = []
+            for image_path in image_paths:
+                try:
+                    image = Image.open(image_path).convert("RGB")
+                except Exception as e:
+                    image = e
+                batch.append((image_path, image))
+                if len(batch) == batch_size:
+                    batches.put(batch)
+                    batch = []
+            if batch:
+                batches.put(batch)
+            batches.put(None)
+        
+        threading.Thread(target=load_images, daemon=True).start()
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            yield batch
+
+    def generate_captions_batched(self, image_paths, get_model, batch_size=4, max_length=0, use_store=True,
+                                  model_key=None):
+        """
+        Caption images in batches with Moondream2's batch_answer, which encodes the
+        whole batch at once and generates the answers together.
+        Images whose pixels were captioned before (same model, prompt and max length)
+        are answered from the caption store; get_model() is only called, to get the
+        (tokenizer, model), once an image actually needs the model.
+        Falls back to one image at a time when the model has no batch API.
+        Yields (image_path, caption) in input order, images are skipped if the model
+        can't be loaded. Inference holds the lock of model_key, the model's registry key.
+        """
+        model_lock = model_registry.get_model_lock(model_key or cpu_inference.get_model_key(CAPTION_MODEL_ID,
+                                                                                            self.device))
+        tokenizer = model = None
+        model_failed = False
+        use_batches = batch_size > 1
+        stored_count = 0
+        
+        for batch in self.iter_image_batches(image_paths, batch_size if use_batches else 1):
+            captions = {}
+            images = []
+            for path, image in batch:
+                if isinstance(image, Exception):
+                    captions[path] = f"{CAPTION_FAILED_PREFIX}{str(image)}"
+                    continue
+                content_hash = caption_store.image_hash(image)
+                caption = caption_store.get_caption(
+                    content_hash, CAPTION_MODEL_ID, CAPTION_QUESTION, max_length) if use_store else None
+                if caption is not None:
+                    captions[path] = caption
+                    stored_count += 1
+                else:
+                    images.append((path, image, content_hash))
+            
+            if images and model is None and not model_failed:
+                tokenizer, model = get_model()
+                model_failed = model is None
+                if model is not None and use_batches and not hasattr(model, "batch_answer"):
+                    print("Model has no batch_answer, captioning one image at a time")
+                    use_batches = False
+            if model_failed:
+                images = []
+            
+            answers = {}
+            if use_batches and len(images) > 1:
+                try:
+                    with model_lock, torch.inference_mode():
+                        batch_answers = model.batch_answer([image for _, image, _ in images],
+                                                           [CAPTION_QUESTION] * len(images), tokenizer)
+                    for (path, _, _), answer in zip(images, batch_answers):
+                        answers[path] = answer
+                except Exception as e:
+                    print(f"Batched captioning failed, captioning one image at a time: {e}")
+            
+            for path, image, content_hash in images:
+                try:
+                    if path not in answers:
+                        with model_lock, torch.inference_mode():
+                            answers[path] = model.answer_question(model.encode_image(image), CAPTION_QUESTION, tokenizer)
+                    caption = self.truncate_caption(self.clean_caption(answers[path]), max_length)
+                    caption_store.put_caption(content_hash, CAPTION_MODEL_ID, CAPTION_QUESTION, caption, max_length)
+                    captions[path] = caption
+                except Exception as e:
+                    print(f"Error generating caption: {e}")
+                    captions[path] = f"{CAPTION_FAILED_PREFIX}{str(e)}"
+            
+            for path, _ in batch:
+                if path in captions:
+                    yield path, captions[path]
+        
+        if stored_count:
+            print(f"Reused {stored_count} captions from the caption store")
+
+    def caption_stream(self, path_queue, get_model, batch_size=4, max_length=0, use_store=True,
+                       dedup_threshold=frame_dedup.DEFAULT_DEDUP_THRESHOLD, on_caption=None, model_key=None):
+        """
+        Caption images as they arrive on path_queue until None is received.
+        Whatever is waiting (up to batch_size images) is captioned together, so the first
+        captions don't wait for a full batch. Near-identical images reuse the caption of
+        the first such image seen, including ones from earlier batches.
+        Calls on_caption(image_path, caption) for every image.
+        """
+        rep_paths, rep_hashes, rep_brightness = [], [], []
+        rep_captions = {}
+        finished = False
+        
+        while not finished:
+            paths = [path_queue.get()]
+            while len(paths) < batch_size and paths[-1] is not None:
+                try:
+                    paths.append(path_queue.get_nowait())
+                except queue.Empty:
+                    break
+            finished = paths[-1] is None
+            paths = [path for path in paths if path is not None]
+            if not paths:
+                continue
+            
+            try:
+                groups = {}
+                hashes, brightness, valid = frame_dedup.dhash_files(paths) if dedup_threshold > 0 else (None, None, [])
+                for i, path in enumerate(paths):
+                    if i < len(valid) and valid[i]:
+                        match = frame_dedup.find_match(hashes[i], brightness[i], np.array(rep_hashes, dtype=np.uint64),
+                                                       np.array(rep_brightness), dedup_threshold)
+                        representative = rep_paths[match] if match >= 0 else None
+                        if representative in rep_captions:
+                            on_caption(path, rep_captions[representative])
+                            continue
+                        if representative in groups:
+                            groups[representative].append(path)
+                            continue
+                        rep_paths.append(path)
+                        rep_hashes.append(hashes[i])
+                        rep_brightness.append(brightness[i])
+                    groups[path] = [path]
+                
+                for representative, caption in self.generate_captions_batched(list(groups), get_model, batch_size,
+                                                                              max_length, use_store, model_key):
+                    if not caption.startswith(CAPTION_FAILED_PREFIX):
+                        rep_captions[representative] = caption
+                    for path in groups[representative]:
+                        on_caption(path, caption)
+            except Exception as e:
+                print(f"Error in caption worker: {e}")
+
+    def clean_caption(self, answer, question=CAPTION_QUESTION):
+        """Strip echoed questions and answer prefixes from a Moondream2 answer"""
+        caption = answer.strip()
+        
+        # Clean up
+        patterns_to_remove = [
+            question,
+            f"{question}:",
+            f"Question: {question}",
+            f"Q: {question}",
+        ]
+        
+        for pattern in patterns_to_remove:
+            if caption.lower().startswith(pattern.lower()):
+                caption = caption[len(pattern):].lstrip(" :-")
+                break
+        
+        if caption.lower().startswith("answer:"):
+            caption = caption[7:].strip()
+        elif caption.lower().startswith("a:"):
+            caption = caption[2:].strip()
+        
+        return caption.strip()
 
     def save_description_txt(self, image_path, description):
         """Save description as .txt file"""
@@ -398,7 +1313,19 @@ class VideoSceneGenerationNode:
                       max_description_length, save_scenes, generate_descriptions,
                       extract_end_frames, extract_scene_videos, scene_video_format, 
                       video_codec, audio_codec, video_quality, use_cache, 
-                      scene_detection_method, selected_scene_index, scene_description):
+                      scene_detection_method, selected_scene_index, scene_description,
+                      single_pass_capture=True, detection_stride=5, refine_cuts=True,
+                      analysis_resolution="auto", detection_workers=1, adaptive_threshold=False,
+                      frame_extractor="ffmpeg", keyframe_format="png", keyframe_quality=90, png_compression=6,
+                      video_export_mode="per_scene", video_export_workers=0, video_export_retries=1,
+                      caption_batch_size=4, keep_models_loaded=True,
+                      caption_dedup_threshold=frame_dedup.DEFAULT_DEDUP_THRESHOLD, pipeline_mode="phased",
+                      selected_scene_first=False, cpu_precision="float32", cpu_threads=0, cpu_warmup=True,
+                      export_metadata_json=True, cache_budget_gb=0.0, unique_id=None, scene_callback=None,
+                      caption_callback=None):
+        # Arguments for a background run finishing the other scenes
+        run_args = dict(locals())
+        del run_args["self"]
         
         # Get ComfyUI output directory
         comfy_output_dir = folder_paths.get_output_directory()
@@ -435,18 +1362,40 @@ class VideoSceneGenerationNode:
                                       max_description_length, save_scenes, generate_descriptions, 
                                       output_dir, scene_detection_method, extract_end_frames,
                                       extract_scene_videos, scene_video_format, video_codec, 
-                                      audio_codec, video_quality)
+                                      audio_codec, video_quality, detection_stride, refine_cuts,
+                                      analysis_resolution, adaptive_threshold, keyframe_format,
+                                      keyframe_quality, png_compression)
         
         print(f"Cache key: {cache_key}")
         print(f"Use cache: {use_cache}")
         print(f"Scene detection method: {scene_detection_method}")
+        print(f"Detection stride: {detection_stride} (refine cuts: {refine_cuts})")
+        print(f"Analysis resolution: {analysis_resolution}")
+        print(f"Keyframe format: {keyframe_format}")
         print(f"Extract end frames: {extract_end_frames}")
         print(f"Extract scene videos: {extract_scene_videos}")
         
+        # A background job still finishing this configuration writes the cache when done,
+        # one this node started for other settings finishes before the next run starts
+        for job in (_background_jobs.get(cache_key), self.background_job):
+            if job and job.is_alive() and job is not threading.current_thread():
+                print("Waiting for the background job finishing the scenes...")
+                job.join(BACKGROUND_JOB_TIMEOUT)
+                if job.is_alive():
+                    print(f"Background job still running after {BACKGROUND_JOB_TIMEOUT}s, "
+                          f"queue the run again when it is done")
+                    return self.return_empty(scene_output_dir)
+        
         cached_results = None
         if use_cache:
             cached_results = self.load_cached_results(cache_key, scene_output_dir)
         
+        if not cached_results and selected_scene_first and save_scenes:
+            if scene_description and scene_description.strip():
+                print("Edited description given, processing all scenes before returning")
+            else:
+                return self.extract_selected_scene_first(run_args, cache_key, scene_output_dir)
+        
         if cached_results:
             # Use cached results
             scene_paths = cached_results["scene_paths"]
@@ -462,7 +1411,8 @@ class VideoSceneGenerationNode:
             if scene_video_paths:
                 print(f"✓ Loaded {len(scene_video_paths)} scene videos from cache")
             
-            # Update metadata path if needed
+            # Update metadata path if needed, the cache may come from a copy of the video at another path
+            metadata["video_file"] = video_file
             metadata["full_output_path"] = scene_output_dir
             metadata["output_directory_name"] = output_dir
             
@@ -476,246 +1426,438 @@ class VideoSceneGenerationNode:
             print(f"Detecting scenes from {start_seconds}s to {end_seconds}s...")
             print(f"Output directory: {scene_output_dir}")
             
-            # Extract scenes based on selected method
-            if scene_detection_method == "opencv":
-                print("Using OpenCV scene detection")
-                scene_timestamps = self.detect_scenes_opencv(video_file, start_seconds, end_seconds, scene_threshold)
-            elif scene_detection_method == "pyscene_openvideo":
-                print("Using PySceneDetect OpenVideo scene detection")
-                scene_timestamps = self.detect_scenes_pyscene_openvideo(video_file, start_seconds, end_seconds, scene_threshold)
-            elif scene_detection_method == "pyscene_videomanager":
-                print("Using PySceneDetect VideoManager scene detection")
-                scene_timestamps = self.detect_scenes_pyscene_videomanager(video_file, start_seconds, end_seconds, scene_threshold)
+            # Completion records of this configuration, so an interrupted run only redoes missing outputs
+            progress_path = os.path.join(scene_output_dir, f"progress_{cache_key}.json")
+            if use_cache:
+                progress = self.load_progress(progress_path)
             else:
+                progress = {"frames": {}, "clips": {}, "descriptions": {}}
+            
+            # Frames decoded during detection, keyed by frame number (single-pass capture)
+            captured_frames = {} if (single_pass_capture and save_scenes) else None
+            
+            detection_workers = detection_workers or os.cpu_count() or 1
+            if scene_detection_method not in ("opencv", "histogram", "pyscene_openvideo", "pyscene_videomanager"):
                 print(f"Unknown scene detection method: {scene_detection_method}, defaulting to OpenCV")
-                scene_timestamps = self.detect_scenes_opencv(video_file, start_seconds, end_seconds, scene_threshold)
-            
-            print(f"Found {len(scene_timestamps)} scenes")
-            
-            # Calculate scene end timestamps (each scene ends at the start of the next scene, minus 1 frame)
-            scene_end_timestamps = []
-            for i in range(len(scene_timestamps)):
-                if i < len(scene_timestamps) - 1:
-                    # Get the frame before the next scene starts
-                    # We'll get video FPS to calculate frame duration
-                    cap = cv2.VideoCapture(video_file)
-                    fps = cap.get(cv2.CAP_PROP_FPS)
-                    cap.release()
-                    
-                    if fps > 0:
-                        frame_duration = 1.0 / fps
-                        # Set end timestamp to 1 frame before next scene starts
-                        scene_end_timestamps.append(scene_timestamps[i + 1] - frame_duration)
-                    else:
-                        # Default to 30fps if unknown
-                        scene_end_timestamps.append(scene_timestamps[i + 1] - 1.0/30.0)
-                else:
-                    # Last scene ends at video end or specified end time
-                    scene_end_timestamps.append(end_seconds)
+                scene_detection_method = "opencv"
+            elif detection_workers > 1 and scene_detection_method.startswith("pyscene"):
+                print("Parallel detection is not available for PySceneDetect, running on a single thread")
             
-            # Extract and save scene frames with progress bar
-            scene_paths = []
-            scene_end_paths = [] if extract_end_frames else []
+            # Get video FPS once to calculate frame duration
+            fps = self.get_video_fps(video_file)
+            # The last scene ends on the last frame detection decodes, end_seconds may be one past it
+            frame_count = self.get_frame_count(video_file)
+            scenes_end_seconds = min(end_seconds, (frame_count - 1) / fps) if frame_count > 0 else end_seconds
             
-            if save_scenes:
-                print(f"Extracting {len(scene_timestamps)} scene frames...")
-                
-                # Create progress bar for scene extraction
-                total_scenes = len(scene_timestamps)
-                self.create_progress_bar(total_scenes, "Extracting scene frames")
+            caption_model_key = cpu_inference.get_model_key(CAPTION_MODEL_ID, self.device, cpu_precision)
+            
+            def get_model():
+                print(f"\nLoading Moondream2 model for caption generation...")
+                return self.load_moondream_model(cpu_precision, cpu_threads, cpu_warmup)
+            
+            # Each stage has its own key, so a run only recomputes the stages whose inputs changed
+            detection_key = stage_cache.get_stage_key(
+                "detection", video=self.get_video_hash(video_file), start_time=start_time, end_time=end_time,
+                method=scene_detection_method, threshold=scene_threshold, stride=detection_stride,
+                refine_cuts=refine_cuts, analysis_resolution=analysis_resolution,
+                adaptive_threshold=adaptive_threshold)
+            frames_key = stage_cache.get_stage_key(
+                "frames", detection=detection_key, end_frames=extract_end_frames, format=keyframe_format,
+                quality=keyframe_quality, png_compression=png_compression)
+            clips_key = stage_cache.get_stage_key(
+                "clips", detection=detection_key, format=scene_video_format, video_codec=video_codec,
+                audio_codec=audio_codec, video_quality=video_quality)
+            descriptions_key = stage_cache.get_stage_key(
+                "descriptions", frames=frames_key, model=CAPTION_MODEL_ID, max_length=max_description_length,
+                dedup_threshold=caption_dedup_threshold)
+            
+            # A stage's artifacts are only reused when the stages it depends on were reused too
+            detection_stage = frames_stage = clips_stage = descriptions_stage = None
+            if use_cache:
+                detection_stage = stage_cache.load_stage(scene_output_dir, "detection", detection_key)
+            if detection_stage and save_scenes:
+                frames_stage = stage_cache.load_stage(scene_output_dir, "frames", frames_key)
+            if detection_stage and extract_scene_videos:
+                clips_stage = stage_cache.load_stage(scene_output_dir, "clips", clips_key)
+            if frames_stage and generate_descriptions:
+                descriptions_stage = stage_cache.load_stage(scene_output_dir, "descriptions", descriptions_key)
+                if descriptions_stage and not all(os.path.exists(path)
+                                                  for path in descriptions_stage["description_paths"]):
+                    descriptions_stage = None
+            
+            # Progress records are shared with the caption worker in streaming mode
+            progress_lock = threading.Lock()
+            caption_queue = None
+            streaming = pipeline_mode == "streaming" and save_scenes
+            detection_thread = None
+            
+            if detection_stage:
+                scene_timestamps = detection_stage["scene_timestamps"]
+                scene_end_timestamps = detection_stage["scene_end_timestamps"]
+                print(f"Reusing {len(scene_timestamps)} detected scenes")
+                scenes = zip(scene_timestamps, scene_end_timestamps)
+            elif streaming:
+                # Detection runs on a background thread and reports each cut through a bounded
+                # queue, a scene's frames are written as soon as the next cut is known
+                print("Pipeline mode: streaming")
+                cut_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+                detection = {}
+                
+                def run_detection():
+                    try:
+                        detection["timestamps"] = self.run_scene_detection(
+                            video_file, scene_output_dir, start_seconds, end_seconds, scene_threshold,
+                            scene_detection_method, use_cache, captured_frames, detection_stride, refine_cuts,
+                            analysis_resolution, detection_workers, adaptive_threshold, on_cut=cut_queue.put)
+                    except Exception as e:
+                        print(f"Scene detection error: {e}")
+                    finally:
+                        cut_queue.put(None)
+                
+                detection_thread = threading.Thread(target=run_detection, daemon=True)
+                detection_thread.start()
+                scenes = self.iter_streamed_scenes(cut_queue, detection, start_seconds, scenes_end_seconds, fps)
+            else:
+                scene_timestamps = self.run_scene_detection(video_file, scene_output_dir, start_seconds, end_seconds,
+                                                            scene_threshold, scene_detection_method, use_cache,
+                                                            captured_frames, detection_stride, refine_cuts,
+                                                            analysis_resolution, detection_workers, adaptive_threshold)
+                
+                print(f"Found {len(scene_timestamps)} scenes")
+                if captured_frames:
+                    print(f"Captured {len(captured_frames)} frames during detection (single pass)")
+                
+                # Each scene ends 1 frame before the next scene starts
+                scene_end_timestamps = self.get_scene_end_timestamps(scene_timestamps, fps, scenes_end_seconds)
+                scenes = zip(scene_timestamps, scene_end_timestamps)
+                self.save_detection_stage(scene_output_dir, detection_key, scene_timestamps, scene_end_timestamps,
+                                          use_cache)
+            
+            if streaming and generate_descriptions and not descriptions_stage:
+                # Written frames go straight to a caption worker through another bounded queue
+                caption_queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+                queued_captions = set()
+                
+                def queue_caption(image_path):
+                    txt_path = os.path.splitext(image_path)[0] + '.txt'
+                    with progress_lock:
+                        if image_path in queued_captions:
+                            return
+                        complete = use_cache and self.is_output_complete(progress, "descriptions", txt_path)
+                        if not complete:
+                            queued_captions.add(image_path)
+                    if not complete:
+                        caption_queue.put(image_path)
+                    elif caption_callback:
+                        caption_callback(image_path)
+                
+                def save_caption(image_path, caption):
+                    txt_path = self.save_description_txt(image_path, caption)
+                    # Failed captions are left unrecorded so a resumed run captions them again
+                    if not caption.startswith(CAPTION_FAILED_PREFIX):
+                        with progress_lock:
+                            self.record_output(progress, "descriptions", txt_path)
+                            self.save_progress(progress_path, progress)
+                    print(f"Saved description to: {os.path.basename(txt_path)}")
+                    if caption_callback:
+                        caption_callback(image_path)
+                
+                caption_thread = threading.Thread(
+                    target=self.caption_stream,
+                    args=(caption_queue, get_model, caption_batch_size, max_description_length, use_cache,
+                          caption_dedup_threshold, save_caption, caption_model_key),
+                    daemon=True)
+                caption_thread.start()
+            
+            # Extract and save scene frames with progress bar
+            scene_paths = []
+            scene_end_paths = [] if extract_end_frames else []
+            image_ext = KEYFRAME_FORMATS.get(keyframe_format, KEYFRAME_FORMATS["png"])[0]
+            
+            if save_scenes and frames_stage:
+                scene_paths = frames_stage["scene_paths"]
+                scene_end_paths = frames_stage["scene_end_paths"]
+                print(f"Reusing {len(scene_paths)} scene frames")
+                
+            elif save_scenes:
+                if detection_thread:
+                    print("Extracting scene frames while scenes are detected...")
+                else:
+                    print(f"Extracting {len(scene_timestamps)} scene frames...")
+                    
+                    # Create progress bar for scene extraction
+                    total_scenes = len(scene_timestamps)
+                    self.create_progress_bar(total_scenes, "Extracting scene frames")
+                
+                # Frames not captured during detection, decoded together afterwards: {frame_number: [paths]}
+                pending_frames = {}
+                writer = FrameWriter(keyframe_format, keyframe_quality, png_compression)
+                on_written = queue_caption if caption_queue else None
                 
-                for i, (timestamp, end_timestamp) in enumerate(zip(scene_timestamps, scene_end_timestamps)):
+                def notify_start_written(index, start, end, path):
+                    if on_written:
+                        on_written(path)
+                    scene_callback(index, path, start, end)
+                
+                for i, (timestamp, end_timestamp) in enumerate(scenes):
                     # Extract start frame
-                    scene_filename = f"scene_{i:04d}_at_{timestamp:.2f}s.png"
+                    scene_filename = f"scene_{i:04d}_at_{timestamp:.2f}s.{image_ext}"
                     scene_path = os.path.join(images_dir, scene_filename)
                     
+                    on_start_written = (functools.partial(notify_start_written, i, timestamp, end_timestamp)
+                                        if scene_callback else on_written)
+                    # A scene too short for its own end frame writes the start frame twice
+                    duplicate_start = extract_end_frames and end_timestamp <= timestamp
+                    
                     # Update progress
-                    self.update_progress(i + 1, total_scenes, f"Extracting frame {i+1}/{total_scenes}")
+                    if detection_thread:
+                        print(f"Scene {i+1} at {timestamp:.2f}s")
+                    else:
+                        self.update_progress(i + 1, total_scenes, f"Extracting frame {i+1}/{total_scenes}")
                     
-                    self.extract_frame(video_file, timestamp, scene_path)
+                    self.write_scene_frame(timestamp, scene_path, fps, captured_frames, pending_frames, writer,
+                                           progress if use_cache else None, on_start_written,
+                                           release=not duplicate_start)
                     scene_paths.append(scene_path)
                     
                     # Extract end frame if enabled
                     if extract_end_frames:
                         # Ensure we don't extract the same frame if scene is very short
                         if end_timestamp > timestamp:
-                            end_filename = f"scene_{i:04d}_at_{timestamp:.2f}s_end.png"
+                            end_filename = f"scene_{i:04d}_at_{timestamp:.2f}s_end.{image_ext}"
                             end_path = os.path.join(images_dir, end_filename)
                             
                             # Extract frame at end_timestamp (or slightly before if at scene boundary)
-                            self.extract_frame(video_file, end_timestamp, end_path)
+                            self.write_scene_frame(end_timestamp, end_path, fps, captured_frames, pending_frames,
+                                                   writer, progress if use_cache else None, on_written)
                             scene_end_paths.append(end_path)
-                            print(f"  Saved end frame: {os.path.basename(end_path)}")
                         else:
                             # If scene is too short, just duplicate start frame
-                            end_filename = f"scene_{i:04d}_at_{timestamp:.2f}s_end.png"
+                            end_filename = f"scene_{i:04d}_at_{timestamp:.2f}s_end.{image_ext}"
                             end_path = os.path.join(images_dir, end_filename)
-                            shutil.copy2(scene_path, end_path)
+                            self.write_scene_frame(timestamp, end_path, fps, captured_frames, pending_frames,
+                                                   writer, progress if use_cache else None, on_written)
                             scene_end_paths.append(end_path)
                             print(f"  Scene too short, duplicated start frame as end frame")
                 
+                if detection_thread:
+                    detection_thread.join()
+                    scene_timestamps = detection["scene_timestamps"]
+                    scene_end_timestamps = detection["scene_end_timestamps"]
+                    print(f"Found {len(scene_timestamps)} scenes")
+                    self.save_detection_stage(scene_output_dir, detection_key, scene_timestamps, scene_end_timestamps,
+                                              use_cache)
+                
+                if pending_frames:
+                    if frame_extractor == "ffmpeg" and not self.check_ffmpeg():
+                        print("FFmpeg not available, extracting frames with OpenCV")
+                        frame_extractor = "opencv"
+                    
+                    if frame_extractor == "ffmpeg":
+                        pending_frames = self.extract_frames_ffmpeg(video_file, pending_frames, images_dir, writer)
+                        if pending_frames:
+                            print(f"FFmpeg missed {len(pending_frames)} frames, extracting them with OpenCV")
+                    
+                    if pending_frames:
+                        self.extract_frames(video_file, pending_frames, os.path.join(scene_output_dir, "scene_index"),
+                                            writer)
+                
+                writer.close()
+                with progress_lock:
+                    for path in scene_paths + scene_end_paths:
+                        self.record_output(progress, "frames", path)
+                    self.save_progress(progress_path, progress)
+                
+                # Stages are only saved complete, a missing frame is retried by the next run
+                frame_paths = scene_paths + scene_end_paths
+                if use_cache and scene_paths and all(os.path.exists(path) for path in frame_paths):
+                    stage_cache.save_stage(scene_output_dir, "frames", frames_key,
+                                           {"scene_paths": scene_paths, "scene_end_paths": scene_end_paths},
+                                           files=frame_paths)
+                
             else:
                 # Just create paths without extracting
                 for i, timestamp in enumerate(scene_timestamps):
-                    scene_filename = f"scene_{i:04d}_at_{timestamp:.2f}s.png"
+                    scene_filename = f"scene_{i:04d}_at_{timestamp:.2f}s.{image_ext}"
                     scene_path = os.path.join(images_dir, scene_filename)
                     scene_paths.append(scene_path)
                     
                     if extract_end_frames:
-                        end_filename = f"scene_{i:04d}_at_{timestamp:.2f}s_end.png"
+                        end_filename = f"scene_{i:04d}_at_{timestamp:.2f}s_end.{image_ext}"
                         end_path = os.path.join(images_dir, end_filename)
                         scene_end_paths.append(end_path)
             
+            if save_scenes:
+                # Frames decoded after detection
+                if scene_callback:
+                    for i, path in enumerate(scene_paths):
+                        if os.path.exists(path):
+                            scene_callback(i, path, scene_timestamps[i], scene_end_timestamps[i])
+                
+                # Descriptions reused from an earlier run are final already
+                if caption_callback and descriptions_stage:
+                    for path in scene_paths + scene_end_paths:
+                        caption_callback(path)
+                
+                # Frames decoded after detection still need captions
+                if caption_queue:
+                    for path in scene_paths + scene_end_paths:
+                        if os.path.exists(path):
+                            queue_caption(path)
+                
+                # Release captured frames now that they are on disk
+                captured_frames = None
+            
             # Extract scene videos if requested
             scene_video_paths = []
-            if extract_scene_videos and len(scene_timestamps) > 0:
+            if extract_scene_videos and clips_stage:
+                scene_video_paths = clips_stage["scene_video_paths"]
+                print(f"Reusing {len(scene_video_paths)} scene videos")
+            elif extract_scene_videos and len(scene_timestamps) > 0:
                 print(f"\nExtracting {len(scene_timestamps)} scene videos...")
                 
-                # Create progress bar for video extraction
-                self.create_progress_bar(len(scene_timestamps), "Extracting scene videos")
+                video_jobs = []
+                for i, (scene_start, scene_end) in enumerate(zip(scene_timestamps, scene_end_timestamps)):
+                    video_filename = f"scene_{i:04d}_{scene_start:.2f}s_to_{scene_end:.2f}s.{scene_video_format}"
+                    video_jobs.append((scene_start, scene_end, os.path.join(videos_dir, video_filename)))
                 
-                for i, (start_time, end_time) in enumerate(zip(scene_timestamps, scene_end_timestamps)):
-                    video_filename = f"scene_{i:04d}_{start_time:.2f}s_to_{end_time:.2f}s.{scene_video_format}"
-                    video_path = os.path.join(videos_dir, video_filename)
-                    
-                    # Update progress
-                    self.update_progress(i + 1, len(scene_timestamps), f"Extracting video {i+1}/{len(scene_timestamps)}")
-                    
-                    if self.extract_scene_video(video_file, start_time, end_time, video_path,
-                                              video_codec, audio_codec, video_quality, scene_video_format):
-                        scene_video_paths.append(video_path)
+                # Keep clips finished by an earlier run
+                done_paths = {}
+                if use_cache:
+                    for job_start, job_end, video_path in video_jobs:
+                        if self.is_output_complete(progress, "clips", video_path, job_end - job_start):
+                            done_paths[video_path] = video_path
+                    if done_paths:
+                        print(f"Skipping {len(done_paths)} scene videos completed earlier")
+                all_video_jobs = video_jobs
+                video_jobs = [job for job in video_jobs if job[2] not in done_paths]
+                
+                def record_clip(video_path):
+                    with progress_lock:
+                        self.record_output(progress, "clips", video_path)
+                        self.save_progress(progress_path, progress)
+                
+                scene_video_paths = None if video_jobs else []
+                export_function = None
+                if video_jobs and video_export_mode == "smart_cut":
+                    if video_codec == "copy":
+                        export_function = self.get_smart_cut_exporter(video_file, os.path.join(scene_output_dir, "scene_index"))
                     else:
-                        scene_video_paths.append("")
+                        print("Smart cut only applies to copy exports, re-encoding scenes")
+                elif video_jobs and video_export_mode == "single_pass":
+                    # Segments run from one scene start to the next, so they need consecutive scenes
+                    if done_paths:
+                        print("Resuming an interrupted single-pass export scene by scene")
+                    else:
+                        scene_video_paths = self.export_scene_videos_segmented(video_file, video_jobs, video_codec,
+                                                                               audio_codec, video_quality,
+                                                                               scene_video_format,
+                                                                               os.path.join(scene_output_dir, "scene_index"))
+                        if scene_video_paths is None:
+                            print("Single-pass export failed, exporting scenes one by one")
+                        else:
+                            with progress_lock:
+                                for video_path in scene_video_paths:
+                                    self.record_output(progress, "clips", video_path)
+                                self.save_progress(progress_path, progress)
+                
+                if scene_video_paths is None:
+                    scene_video_paths = self.export_scene_videos(video_file, video_jobs, video_codec, audio_codec,
+                                                                 video_quality, scene_video_format,
+                                                                 video_export_workers, video_export_retries,
+                                                                 export_function, record_clip)
+                
+                # Back to scene order, including the clips that were kept
+                exported = dict(zip([job[2] for job in video_jobs], scene_video_paths))
+                exported.update(done_paths)
+                scene_video_paths = [exported.get(job[2], "") for job in all_video_jobs]
+                
+                if use_cache and all(scene_video_paths):
+                    stage_cache.save_stage(scene_output_dir, "clips", clips_key,
+                                           {"scene_video_paths": scene_video_paths}, files=scene_video_paths)
+            
+            # Let the caption worker finish the frames still queued
+            if caption_queue:
+                caption_queue.put(None)
+                caption_thread.join()
+                if not keep_models_loaded:
+                    model_registry.unload_model(caption_model_key)
             
             # Generate descriptions for ALL frames (start and end) if enabled
             all_images_to_describe = []
-            if generate_descriptions:
+            if generate_descriptions and not caption_queue and not descriptions_stage:
                 # Add start frames
                 all_images_to_describe.extend(scene_paths)
                 # Add end frames if enabled
                 if extract_end_frames:
                     all_images_to_describe.extend(scene_end_paths)
             
-            if all_images_to_describe:
-                print(f"\nLoading Moondream2 model for caption generation...")
-                tokenizer, model = self.load_moondream_model()
-                if tokenizer and model:
-                    total_images = len(all_images_to_describe)
-                    print(f"Generating captions for {total_images} images...")
-                    
-                    # Create progress bar for caption generation
-                    self.create_progress_bar(total_images, "Generating captions")
-                    
-                    for i, image_path in enumerate(all_images_to_describe):
-                        if os.path.exists(image_path):
-                            # Update progress
-                            self.update_progress(i + 1, total_images, f"Generating caption {i+1}/{total_images}")
-                            
-                            caption = self.generate_caption(image_path, tokenizer, model)
-                            # Truncate if needed
-                            if len(caption) > max_description_length:
-                                caption = caption[:max_description_length].rsplit(' ', 1)[0] + "..."
-                            
-                            # Save as .txt file with same name
-                            self.save_description_txt(image_path, caption)
-                            print(f"Saved description to: {os.path.basename(image_path).replace('.png', '.txt')}")
-                    
-                    # Clear model from memory
-                    del model
-                    del tokenizer
-                    torch.cuda.empty_cache()
-                    print("Moondream2 model unloaded from memory")
-            
-            # Create metadata
-            metadata = {
-                "video_file": video_file,
-                "output_directory_name": output_dir,
-                "full_output_path": scene_output_dir,
-                "images_directory": images_dir,
-                "videos_directory": videos_dir if extract_scene_videos else None,
-                "start_time": start_time,
-                "end_time": end_time,
-                "scene_threshold": scene_threshold,
-                "max_description_length": max_description_length,
-                "generate_descriptions": generate_descriptions,
-                "extract_end_frames": extract_end_frames,
-                "extract_scene_videos": extract_scene_videos,
-                "scene_video_format": scene_video_format if extract_scene_videos else None,
-                "video_codec": video_codec if extract_scene_videos else None,
-                "audio_codec": audio_codec if extract_scene_videos else None,
-                "video_quality": video_quality if extract_scene_videos else None,
-                "scene_detection_method": scene_detection_method,
-                "total_scenes": len(scene_timestamps),
-                "scenes": []
-            }
+            if all_images_to_describe and use_cache:
+                described = [path for path in all_images_to_describe
+                             if self.is_output_complete(progress, "descriptions", os.path.splitext(path)[0] + '.txt')]
+                if described:
+                    print(f"Keeping {len(described)} descriptions completed earlier")
+                    all_images_to_describe = [path for path in all_images_to_describe if path not in described]
+                    if caption_callback:
+                        for path in described:
+                            caption_callback(path)
             
-            for i, (timestamp, end_timestamp, img_path) in enumerate(zip(scene_timestamps, scene_end_timestamps, scene_paths)):
-                # Get start frame info
-                start_txt_path = img_path.replace('.png', '.txt')
-                start_description = ""
-                if os.path.exists(start_txt_path):
-                    with open(start_txt_path, 'r', encoding='utf-8') as f:
-                        start_description = f.read().strip()
-                
-                # Get end frame info if enabled
-                end_img_path = scene_end_paths[i] if i < len(scene_end_paths) else ""
-                end_txt_path = ""
-                end_description = ""
-                if end_img_path and os.path.exists(end_img_path):
-                    end_txt_path = end_img_path.replace('.png', '.txt')
-                    if os.path.exists(end_txt_path):
-                        with open(end_txt_path, 'r', encoding='utf-8') as f:
-                            end_description = f.read().strip()
-                
-                # Get video info if enabled
-                video_path = scene_video_paths[i] if i < len(scene_video_paths) else ""
+            if all_images_to_describe:
+                existing_images = [path for path in all_images_to_describe if os.path.exists(path)]
+                total_images = len(existing_images)
+                print(f"Generating captions for {total_images} images (batch size {caption_batch_size})...")
                 
-                scene_data = {
-                    "index": i,
-                    "start_timestamp": timestamp,
-                    "end_timestamp": end_timestamp,
-                    "duration": end_timestamp - timestamp,
-                    "start_frame": {
-                        "image_file": os.path.basename(img_path),
-                        "description_file": os.path.basename(start_txt_path),
-                        "description": start_description,
-                        "image_path": img_path,
-                        "description_path": start_txt_path,
-                    }
-                }
+                # Create progress bar for caption generation
+                self.create_progress_bar(total_images, "Generating captions")
                 
-                if extract_end_frames and end_img_path:
-                    scene_data["end_frame"] = {
-                        "image_file": os.path.basename(end_img_path),
-                        "description_file": os.path.basename(end_txt_path) if end_txt_path else "",
-                        "description": end_description,
-                        "image_path": end_img_path,
-                        "description_path": end_txt_path if end_txt_path else "",
-                    }
+                # Near-identical frames share the caption of their group's first frame
+                groups = self.group_similar_images(existing_images, caption_dedup_threshold)
                 
-                if video_path and os.path.exists(video_path):
-                    scene_data["video_file"] = os.path.basename(video_path)
-                    scene_data["video_path"] = video_path
+                captions = self.generate_captions_batched(list(groups), get_model, caption_batch_size,
+                                                          max_description_length, use_store=use_cache,
+                                                          model_key=caption_model_key)
+                completed = 0
+                for representative, caption in captions:
+                    for image_path in groups[representative]:
+                        completed += 1
+                        # Update progress
+                        self.update_progress(completed, total_images, f"Generating caption {completed}/{total_images}")
+                        
+                        # Save as .txt file with same name
+                        txt_path = self.save_description_txt(image_path, caption)
+                        if not caption.startswith(CAPTION_FAILED_PREFIX):
+                            self.record_output(progress, "descriptions", txt_path)
+                        print(f"Saved description to: {os.path.splitext(os.path.basename(image_path))[0]}.txt")
+                        if caption_callback:
+                            caption_callback(image_path)
+                    self.save_progress(progress_path, progress)
                 
-                metadata["scenes"].append(scene_data)
+                # The model stays loaded in the registry for the next run unless asked otherwise
+                if not keep_models_loaded:
+                    model_registry.unload_model(caption_model_key)
+            
+            if generate_descriptions and use_cache and save_scenes and not descriptions_stage:
+                # Edited descriptions change the files, so only their presence is checked on reuse
+                description_paths = [os.path.splitext(path)[0] + '.txt' for path in scene_paths + scene_end_paths]
+                if description_paths and all(os.path.basename(path) in progress["descriptions"]
+                                             for path in description_paths):
+                    stage_cache.save_stage(scene_output_dir, "descriptions", descriptions_key,
+                                           {"description_paths": description_paths})
             
-            # Save metadata
-            metadata_path = os.path.join(scene_output_dir, "metadata.json")
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            
-            # Cache the results
-            if use_cache:
-                self.save_cached_results(cache_key, scene_output_dir, {
-                    "scene_paths": scene_paths,
-                    "scene_end_paths": scene_end_paths,
-                    "scene_video_paths": scene_video_paths,
-                    "scene_timestamps": scene_timestamps,
-                    "scene_end_timestamps": scene_end_timestamps,
-                    "metadata": metadata,
-                    "video_file": video_file,
-                    "output_dir": output_dir,
-                })
+            # Create metadata
+            metadata = self.build_metadata(dict(run_args, output_dir=output_dir,
+                                                extract_scene_videos=extract_scene_videos,
+                                                scene_detection_method=scene_detection_method),
+                                           cache_key, scene_output_dir, scene_timestamps, scene_end_timestamps,
+                                           scene_paths, scene_end_paths, scene_video_paths)
+            
+            # The catalog holds the scenes for the routes and later runs, metadata.json is an export of it
+            self.save_cached_results(cache_key, scene_output_dir, metadata,
+                                     {key: value for key, value in run_args.items() if key != "scene_callback"})
+            if export_metadata_json:
+                metadata_path = os.path.join(scene_output_dir, "metadata.json")
+                with open(metadata_path, 'w') as f:
+                    json.dump(metadata, f, indent=2)
         
         # Adjust selected_scene_index from 1-based to 0-based for internal use
         internal_index = selected_scene_index - 1
@@ -751,13 +1893,14 @@ class VideoSceneGenerationNode:
         selected_description = ""
         if 0 <= internal_index < len(scene_paths):
             scene_path = scene_paths[internal_index]
-            txt_path = scene_path.replace('.png', '.txt')
+            txt_path = os.path.splitext(scene_path)[0] + '.txt'
             
             # If scene_description is provided from UI, use it (edited version)
             if scene_description and scene_description.strip():
                 selected_description = scene_description
-                # Save the edited description to .txt file
-                self.save_description_txt(scene_path, scene_description)
+                # Save the edited description to .txt file and the catalog
+                txt_path = self.save_description_txt(scene_path, scene_description)
+                scene_catalog.set_description(txt_path, scene_description.strip())
                 print(f"Saved edited description for scene {selected_scene_index}")
             elif os.path.exists(txt_path):
                 # Load description from .txt file
@@ -768,11 +1911,16 @@ class VideoSceneGenerationNode:
             if scene_paths:
                 internal_index = 0
                 scene_path = scene_paths[0]
-                txt_path = scene_path.replace('.png', '.txt')
+                txt_path = os.path.splitext(scene_path)[0] + '.txt'
                 if os.path.exists(txt_path):
                     with open(txt_path, 'r', encoding='utf-8') as f:
                         selected_description = f.read().strip()
         
+        # Runs of other settings left in this output directory are removed oldest first
+        if cache_budget_gb > 0:
+            cache_gc.collect_garbage(int(cache_budget_gb * 1024 ** 3), [scene_output_dir],
+                                     keep=[(scene_output_dir, cache_key)])
+        
         print(f"\n✓ Complete! Output saved to: {scene_output_dir}")
         print(f"  - Custom directory name: {output_dir}")
         print(f"  - Start frames: {len(scene_paths)}")
@@ -801,6 +1949,245 @@ class VideoSceneGenerationNode:
                       selected_description, image_tensor, scene_video_paths, scene_end_paths)
         }
     
+    def build_metadata(self, settings, cache_key, scene_output_dir, scene_timestamps, scene_end_timestamps,
+                       scene_paths, scene_end_paths, scene_video_paths, scene_indices=None):
+        """
+        Build the run metadata from the node settings and the scenes found so far.
+        scene_indices gives the scene numbers when only some scenes are known.
+        """
+        extract_scene_videos = settings["extract_scene_videos"]
+        extract_end_frames = settings["extract_end_frames"]
+        metadata = {
+            "run_key": cache_key,
+            "video_file": settings["video_file"],
+            "output_directory_name": settings["output_dir"],
+            "full_output_path": scene_output_dir,
+            "images_directory": scene_output_dir,
+            "videos_directory": os.path.join(scene_output_dir, "videos") if extract_scene_videos else None,
+            "start_time": settings["start_time"],
+            "end_time": settings["end_time"],
+            "scene_threshold": settings["scene_threshold"],
+            "max_description_length": settings["max_description_length"],
+            "generate_descriptions": settings["generate_descriptions"],
+            "extract_end_frames": extract_end_frames,
+            "extract_scene_videos": extract_scene_videos,
+            "scene_video_format": settings["scene_video_format"] if extract_scene_videos else None,
+            "video_codec": settings["video_codec"] if extract_scene_videos else None,
+            "audio_codec": settings["audio_codec"] if extract_scene_videos else None,
+            "video_quality": settings["video_quality"] if extract_scene_videos else None,
+            "scene_detection_method": settings["scene_detection_method"],
+            "total_scenes": len(scene_timestamps),
+            "scenes": []
+        }
+        
+        for i, (timestamp, end_timestamp, img_path) in enumerate(zip(scene_timestamps, scene_end_timestamps, scene_paths)):
+            # Get start frame info
+            start_txt_path = os.path.splitext(img_path)[0] + '.txt'
+            start_description = ""
+            if os.path.exists(start_txt_path):
+                with open(start_txt_path, 'r', encoding='utf-8') as f:
+                    start_description = f.read().strip()
+            
+            # Get end frame info if enabled
+            end_img_path = scene_end_paths[i] if i < len(scene_end_paths) else ""
+            end_txt_path = ""
+            end_description = ""
+            if end_img_path and os.path.exists(end_img_path):
+                end_txt_path = os.path.splitext(end_img_path)[0] + '.txt'
+                if os.path.exists(end_txt_path):
+                    with open(end_txt_path, 'r', encoding='utf-8') as f:
+                        end_description = f.read().strip()
+            
+            # Get video info if enabled
+            video_path = scene_video_paths[i] if i < len(scene_video_paths) else ""
+            
+            scene_data = {
+                "index": scene_indices[i] if scene_indices else i,
+                "start_timestamp": timestamp,
+                "end_timestamp": end_timestamp,
+                "duration": end_timestamp - timestamp,
+                "start_frame": {
+                    "image_file": os.path.basename(img_path),
+                    "description_file": os.path.basename(start_txt_path),
+                    "description": start_description,
+                    "image_path": img_path,
+                    "description_path": start_txt_path,
+                }
+            }
+            
+            if extract_end_frames and end_img_path:
+                scene_data["end_frame"] = {
+                    "image_file": os.path.basename(end_img_path),
+                    "description_file": os.path.basename(end_txt_path) if end_txt_path else "",
+                    "description": end_description,
+                    "image_path": end_img_path,
+                    "description_path": end_txt_path if end_txt_path else "",
+                }
+            
+            if video_path and os.path.exists(video_path):
+                scene_data["video_file"] = os.path.basename(video_path)
+                scene_data["video_path"] = video_path
+            
+            metadata["scenes"].append(scene_data)
+        
+        return metadata
+    
+    def extract_selected_scene_first(self, run_args, cache_key, scene_output_dir):
+        """
+        Return the selected scene's frame and description as soon as they exist and
+        finish the other scenes in a background job. The job runs the normal streaming
+        extraction on its own node instance, so its results end up in the cache; the UI
+        is sent the full scene list when it is done. The description comes from the
+        job's caption worker, which only has the frames queued before it to caption first.
+        """
+        internal_index = max(0, run_args["selected_scene_index"] - 1)
+        selected = {}
+        scenes = {}
+        captioned_paths = set()
+        ready = threading.Event()
+        captioned = threading.Event()
+        worker = type(self)()
+        worker.comfy_progress = False
+        
+        def on_scene_frame(index, image_path, start, end):
+            scenes[index] = (start, end, image_path)
+            if index == internal_index:
+                selected["path"] = image_path
+                ready.set()
+        
+        def on_caption(image_path):
+            captioned_paths.add(image_path)
+            if image_path == selected.get("path"):
+                captioned.set()
+        
+        def run_job():
+            try:
+                selected["result"] = worker.extract_scenes(**dict(run_args, selected_scene_first=False,
+                                                                  pipeline_mode="streaming",
+                                                                  scene_callback=on_scene_frame,
+                                                                  caption_callback=on_caption))
+                print(f"Background job finished {len(selected['result']['result'][1])} scenes")
+                if PromptServer is not None and run_args.get("unique_id") is not None:
+                    PromptServer.instance.send_sync("video_scene.scenes_ready", {
+                        "node": run_args["unique_id"],
+                        "output": selected["result"]["ui"],
+                    })
+            except Exception as e:
+                print(f"Background scene job failed: {e}")
+            finally:
+                _background_jobs.pop(cache_key, None)
+                ready.set()
+                captioned.set()
+        
+        print(f"Processing scene {internal_index + 1} first, the other scenes finish in the background")
+        job = threading.Thread(target=run_job, daemon=True)
+        _background_jobs[cache_key] = job
+        self.background_job = job
+        job.start()
+        if not ready.wait(BACKGROUND_JOB_TIMEOUT):
+            print(f"Scene {internal_index + 1} not ready after {BACKGROUND_JOB_TIMEOUT}s, "
+                  f"the background job refreshes the preview when it is done")
+            return self.return_empty(scene_output_dir)
+        
+        if "path" not in selected:
+            # The job finished without reaching the selected scene (e.g. fewer scenes), its result is complete
+            job.join(BACKGROUND_JOB_TIMEOUT)
+            return selected.get("result") or self.return_empty(scene_output_dir)
+        
+        image_path = selected["path"]
+        if run_args["generate_descriptions"] and image_path not in captioned_paths:
+            if not captioned.wait(BACKGROUND_JOB_TIMEOUT):
+                print(f"Scene {internal_index + 1} has no description after {BACKGROUND_JOB_TIMEOUT}s")
+        
+        # The scenes written so far, in the same shape as a full run's metadata
+        indices = sorted(scenes)
+        known = [scenes[i] for i in indices]
+        known_paths = [path for _, _, path in known]
+        metadata = self.build_metadata(dict(run_args, output_dir=os.path.basename(scene_output_dir)), cache_key,
+                                       scene_output_dir, [start for start, _, _ in known],
+                                       [end for _, end, _ in known], known_paths, [], [], indices)
+        scene_data = metadata["scenes"][known_paths.index(image_path)]
+        description = scene_data["start_frame"]["description"]
+        
+        self.last_video_file = run_args["video_file"]
+        self.last_index = run_args["selected_scene_index"]
+        
+        print(f"✓ Scene {internal_index + 1} ready: {image_path}")
+        return {
+            "ui": {
+                "text": [description],
+                "scene_paths": [known_paths],
+                "scene_end_paths": [[]],
+                "scene_video_paths": [[]],
+                "total_scenes": [len(known_paths)],
+                "selected_index": [known_paths.index(image_path) + 1],
+            },
+            "result": (scene_output_dir, known_paths, json.dumps(metadata, indent=2),
+                      description, self.load_image_as_tensor(image_path), [], [])
+        }
+
+    def run_scene_detection(self, video_file, scene_output_dir, start_seconds, end_seconds, scene_threshold,
+                            scene_detection_method, use_cache, captured_frames=None, detection_stride=5,
+                            refine_cuts=True, analysis_resolution="auto", detection_workers=1,
+                            adaptive_threshold=False, on_cut=None):
+        """
+        Detect scenes with the selected method and return the scene start timestamps.
+        OpenCV and histogram detection reuse or update the score index in scene_index.
+        on_cut is called with each cut as soon as it is final when the detector can report
+        cuts while scanning (OpenCV on one worker), other detectors report nothing early.
+        """
+        # Extract scenes based on selected method
+        if scene_detection_method in ("opencv", "histogram"):
+            if scene_detection_method == "opencv":
+                print("Using OpenCV scene detection")
+                detector = self.detect_scenes_opencv
+                detector_kwargs = {}
+            else:
+                print("Using histogram scene detection")
+                detector = self.detect_scenes_histogram
+                detector_kwargs = {"adaptive_threshold": adaptive_threshold}
+            
+            detector_kwargs.update(captured_frames=captured_frames, stride=detection_stride,
+                                   refine_cuts=refine_cuts, analysis_resolution=analysis_resolution)
+            
+            # Per-frame scores are kept on disk so a new threshold does not need a full rescan
+            fps = self.get_video_fps(video_file)
+            index_path = self.get_score_index_path(scene_output_dir, video_file, scene_detection_method,
+                                                   analysis_resolution, detection_stride)
+            score_index = None
+            if use_cache:
+                score_index = self.load_score_index(index_path, int(start_seconds * fps),
+                                                    min(int(end_seconds * fps), self.get_frame_count(video_file) - 1))
+            
+            if score_index:
+                print("Re-deriving scenes from score index")
+                scene_timestamps = self.detect_scenes_from_index(score_index, scene_detection_method, video_file,
+                                                                 start_seconds, end_seconds, scene_threshold,
+                                                                 **detector_kwargs)
+            else:
+                score_index = {}
+                if detection_workers > 1:
+                    print(f"Parallel detection with {detection_workers} workers")
+                    scene_timestamps = self.detect_scenes_parallel(detector, video_file, start_seconds, end_seconds,
+                                                                   scene_threshold, detection_workers,
+                                                                   score_index=score_index, **detector_kwargs)
+                else:
+                    if on_cut and detector == self.detect_scenes_opencv:
+                        detector_kwargs["on_cut"] = on_cut
+                    scene_timestamps = detector(video_file, start_seconds, end_seconds, scene_threshold,
+                                                score_index=score_index, **detector_kwargs)
+                self.save_score_index(index_path, score_index)
+        elif scene_detection_method == "pyscene_openvideo":
+            print("Using PySceneDetect OpenVideo scene detection")
+            scene_timestamps = self.detect_scenes_pyscene_openvideo(video_file, start_seconds, end_seconds, scene_threshold,
+                                                                    analysis_resolution=analysis_resolution)
+        elif scene_detection_method == "pyscene_videomanager":
+            print("Using PySceneDetect VideoManager scene detection")
+            scene_timestamps = self.detect_scenes_pyscene_videomanager(video_file, start_seconds, end_seconds, scene_threshold,
+                                                                       analysis_resolution=analysis_resolution)
+        
+        return scene_timestamps
+
     def return_empty(self, scene_output_dir):
         """Return empty results when video file not found"""
         blank_tensor = torch.zeros((1, 512, 512, 3), dtype=torch.float32)
@@ -829,8 +2216,174 @@ class VideoSceneGenerationNode:
             filename = "scene_outputs"
         return filename
 
-    def detect_scenes_opencv(self, video_path, start_seconds, end_seconds, threshold):
-        """Simple scene detection using OpenCV"""
+    def get_downscale_factor(self, frame_width, frame_height, analysis_resolution, auto_width=None):
+        """
+        Integer downscale factor that brings a frame close to the analysis resolution.
+        auto aims for a width of auto_width pixels, or keeps the full resolution when
+        it is None (the OpenCV detector, so existing cut lists stay the same)
+        """
+        if analysis_resolution == "full" or frame_width <= 0 or frame_height <= 0:
+            return 1
+        if analysis_resolution in ANALYSIS_RESOLUTIONS:
+            return max(1, int(round(frame_height / ANALYSIS_RESOLUTIONS[analysis_resolution])))
+        if not auto_width:
+            return 1
+        return max(1, frame_width // auto_width)
+
+    def apply_pyscene_downscale(self, scene_manager, frame_size, analysis_resolution):
+        """Apply the analysis resolution to a PySceneDetect SceneManager"""
+        if analysis_resolution == "auto":
+            scene_manager.auto_downscale = True
+            return
+        
+        frame_width, frame_height = frame_size
+        downscale = self.get_downscale_factor(frame_width, frame_height, analysis_resolution)
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = downscale
+        print(f"Analysis downscale factor: {downscale}")
+
+    def prepare_analysis_frame(self, frame, downscale=1):
+        """Convert a BGR frame to the blurred grayscale image used for frame differencing"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        kernel = 21
+        if downscale > 1:
+            height, width = gray.shape
+            gray = cv2.resize(gray, (max(1, width // downscale), max(1, height // downscale)),
+                              interpolation=cv2.INTER_AREA)
+            # Keep the blur radius the same relative to the frame size
+            kernel = max(3, (21 // downscale) | 1)
+        return cv2.GaussianBlur(gray, (kernel, kernel), 0)
+
+    def frame_difference(self, prev_gray, gray):
+        """
+        Fraction of pixels that changed noticeably between two analysis frames.
+        Being a fraction, it does not depend on the analysis resolution.
+        """
+        frame_diff = cv2.absdiff(prev_gray, gray)
+        _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(thresh) / thresh.size
+
+    def refine_cut(self, cap, prev_frame_number, cut_frame_number, cut_features, analyse, compare,
+                   expected_score=None):
+        """
+        Decode every frame between two analysed frames to find the exact cut
+        Args:
+            cap: Open capture
+            prev_frame_number: Last analysed frame before the cut
+            cut_frame_number: Analysed frame where the cut was detected
+            cut_features: Features of the analysed frame at cut_frame_number, used to validate the seek
+            analyse: Function turning a BGR frame into features
+            compare: Function scoring the change between two sets of features
+            expected_score: Score between the two analysed frames, used to validate the seek
+                when cut_features are not available
+        Returns:
+            (cut_frame_number, cut_frame, end_frame) or None if the window could not
+            be decoded reliably. The capture is left positioned after cut_frame_number.
+        """
+        cap.set(cv2.CAP_PROP_POS_FRAMES, prev_frame_number)
+        
+        window = []
+        for frame_number in range(prev_frame_number, cut_frame_number + 1):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            window.append((frame_number, frame))
+        
+        features = [analyse(frame) for _, frame in window]
+        
+        # Seeking is not always frame-accurate, so make sure we landed where we expected
+        if len(window) != cut_frame_number - prev_frame_number + 1:
+            valid = False
+        elif cut_features is not None:
+            valid = np.array_equal(features[-1], cut_features)
+        else:
+            valid = abs(compare(features[0], features[-1]) - expected_score) <= 1e-4 * max(1.0, expected_score)
+        
+        if not valid:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, cut_frame_number + 1)
+            return None
+        
+        return self.find_cut_in_window(window, features, compare)
+
+    def find_cut_in_window(self, window, features, compare):
+        """
+        Exact cut in a run of consecutive decoded frames, the largest change between two of them
+        Args:
+            window: (frame_number, BGR frame) tuples of consecutive frames
+            features: Features of every frame in window
+        Returns:
+            (cut_frame_number, cut_frame, end_frame)
+        """
+        scores = [compare(features[i - 1], features[i]) for i in range(1, len(features))]
+        i = int(np.argmax(scores)) + 1
+        return window[i][0], window[i][1], window[i - 1][1]
+
+    def needs_refinement(self, stride, refine_cuts, captured_frames):
+        """Whether cut candidates found after a scan need their frames decoded again"""
+        # Exact cut frames need the frames in between decoded (and give us the frames to capture)
+        return (refine_cuts and stride > 1) or (captured_frames is not None and stride == 1)
+
+    def select_cuts(self, cap, candidates, start_seconds, fps, min_scene_gap, refine, analyse, compare,
+                    captured_frames=None, refined_cuts=None):
+        """
+        Turn time-ordered cut candidates into scene start timestamps
+        Args:
+            cap: Open capture used to refine cuts
+            candidates: (prev_frame_number, cut_frame_number, cut_features, score) tuples,
+                either cut_features or score is used to validate refinement seeks
+            min_scene_gap: Minimum seconds between two cuts
+            refine: Decode the frames between analysed frames to find the exact cut
+            analyse, compare: Feature functions passed to refine_cut
+            captured_frames: Optional dict receiving the frames around each accepted cut
+            refined_cuts: Optional {cut_frame_number: refine_cut result} already found while
+                scanning, used instead of seeking back to the cut
+        """
+        scene_timestamps = [start_seconds]
+        for prev_number, cut_number, cut_features, score in candidates:
+            # A refined cut can only move earlier, so check the minimum gap first
+            if (cut_number / fps - scene_timestamps[-1]) <= min_scene_gap:
+                continue
+            
+            start_raw = end_raw = None
+            if refine:
+                refined = refined_cuts.get(cut_number) if refined_cuts else None
+                if refined is None:
+                    refined = self.refine_cut(cap, prev_number, cut_number, cut_features, analyse, compare,
+                                              expected_score=score)
+                if refined:
+                    cut_number, start_raw, end_raw = refined
+            
+            cut_time = cut_number / fps
+            if (cut_time - scene_timestamps[-1]) > min_scene_gap:
+                scene_timestamps.append(cut_time)
+                if captured_frames is not None and start_raw is not None:
+                    captured_frames[cut_number] = start_raw
+                    captured_frames[cut_number - 1] = end_raw
+        
+        return scene_timestamps
+
+    def detect_scenes_opencv(self, video_path, start_seconds, end_seconds, threshold, captured_frames=None,
+                             stride=5, refine_cuts=True, analysis_resolution="auto",
+                             min_scene_gap=2.0, frame_range=None, append_end=True, score_index=None,
+                             on_cut=None):
+        """
+        Simple scene detection using OpenCV
+        Args:
+            captured_frames: Optional dict filled with {frame_number: BGR frame} for the
+                first frame of every scene and the last frame before every cut, so
+                scene frames can be written without decoding the video again
+            stride: Analyse every Nth frame, skipped frames are only grabbed
+            refine_cuts: Decode every frame around a detected cut so the scene
+                boundary lands on the exact frame
+            analysis_resolution: Resolution frames are downscaled to before differencing
+            min_scene_gap: Minimum seconds between two cuts
+            frame_range: Optional (start_frame, end_frame) overriding the time range
+            append_end: Add a final timestamp when the range ends well after the last cut
+            score_index: Optional dict filled with the frame numbers and scores of every
+                analysed frame, so cuts can later be re-derived without decoding
+            on_cut: Optional callback called with each cut time as soon as it is final,
+                after its frames were added to captured_frames
+        """
         try:
             cap = cv2.VideoCapture(video_path)
             if not cap.isOpened():
@@ -842,6 +2395,8 @@ class VideoSceneGenerationNode:
             
             start_frame = int(start_seconds * fps)
             end_frame = int(end_seconds * fps)
+            if frame_range:
+                start_frame, end_frame = frame_range
             
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             end_frame = min(end_frame, total_frames - 1)
@@ -849,41 +2404,93 @@ class VideoSceneGenerationNode:
             if start_frame >= end_frame:
                 return [start_seconds]
             
+            stride = max(1, int(stride))
+            threshold_scaled = threshold / 1000
+            downscale = self.get_downscale_factor(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                                  int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                                                  analysis_resolution)
+            
             cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
             
             scene_timestamps = [start_seconds]
-            prev_frame = None
-            
-            while cap.isOpened():
-                ret, frame = cap.read()
-                current_frame = int(cap.get(cv2.CAP_PROP_POS_FRAMES)) - 1
+            prev_gray = None
+            prev_number = None
+            prev_raw = None
+            last_raw = None
+            current_frame = start_frame
+            index_frames = []
+            index_scores = []
+            
+            while current_frame <= end_frame:
+                # grab() decodes without the colour conversion and copy done by retrieve()
+                if not cap.grab():
+                    break
                 
-                if not ret or current_frame > end_frame:
+                is_last = current_frame == end_frame
+                if (current_frame - start_frame) % stride != 0 and not (is_last and captured_frames is not None):
+                    current_frame += 1
+                    continue
+                
+                ret, frame = cap.retrieve()
+                if not ret:
                     break
+                last_raw = (current_frame, frame)
+                
+                if captured_frames is not None and not captured_frames:
+                    captured_frames[current_frame] = frame
                 
-                if (current_frame - start_frame) % 5 != 0:
+                if (current_frame - start_frame) % stride != 0:
+                    current_frame += 1
                     continue
                 
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                gray = cv2.GaussianBlur(gray, (21, 21), 0)
+                gray = self.prepare_analysis_frame(frame, downscale)
                 
-                if prev_frame is not None:
-                    frame_diff = cv2.absdiff(prev_frame, gray)
-                    _, thresh = cv2.threshold(frame_diff, 25, 255, cv2.THRESH_BINARY)
-                    diff_percentage = np.sum(thresh) / (thresh.size * 255)
+                if prev_gray is not None:
+                    diff_percentage = self.frame_difference(prev_gray, gray)
+                    index_frames.append(current_frame)
+                    index_scores.append(diff_percentage)
                     
-                    threshold_scaled = threshold / 1000
-                    if diff_percentage > threshold_scaled:
-                        current_time = current_frame / fps
-                        if (current_time - scene_timestamps[-1]) > 2.0:
-                            scene_timestamps.append(current_time)
+                    # A refined cut can only move earlier, so check the minimum gap first
+                    if diff_percentage > threshold_scaled and \
+                            (current_frame / fps - scene_timestamps[-1]) > min_scene_gap:
+                        cut_number, start_raw = current_frame, frame
+                        end_raw = prev_raw if stride == 1 else None
+                        
+                        if refine_cuts and stride > 1:
+                            refined = self.refine_cut(cap, prev_number, current_frame, gray,
+                                                      lambda f: self.prepare_analysis_frame(f, downscale),
+                                                      self.frame_difference)
+                            if refined:
+                                cut_number, start_raw, end_raw = refined
+                        
+                        cut_time = cut_number / fps
+                        if (cut_time - scene_timestamps[-1]) > min_scene_gap:
+                            scene_timestamps.append(cut_time)
+                            if captured_frames is not None:
+                                captured_frames[cut_number] = start_raw
+                                if end_raw is not None:
+                                    captured_frames[cut_number - 1] = end_raw
+                            if on_cut:
+                                on_cut(cut_time)
                 
-                prev_frame = gray
+                prev_gray = gray
+                prev_number = current_frame
+                prev_raw = frame
+                current_frame += 1
             
             cap.release()
             
-            if scene_timestamps and (end_seconds - scene_timestamps[-1]) > 3.0:
-                scene_timestamps.append(min(end_seconds, total_frames / fps))
+            if score_index is not None:
+                score_index.update(frame_numbers=np.array(index_frames, dtype=np.int64),
+                                   scores=np.array(index_scores, dtype=np.float32), stride=stride,
+                                   start_frame=start_frame, end_frame=end_frame)
+            
+            # The last decoded frame closes the final scene
+            if captured_frames is not None and last_raw is not None:
+                captured_frames[last_raw[0]] = last_raw[1]
+            
+            if append_end and scene_timestamps and (end_seconds - scene_timestamps[-1]) > 3.0:
+                scene_timestamps.append(min(end_seconds, (total_frames - 1) / fps))
             
             return scene_timestamps
             
@@ -891,7 +2498,405 @@ class VideoSceneGenerationNode:
             print(f"OpenCV scene detection error: {e}")
             return [start_seconds]
 
-    def detect_scenes_pyscene_openvideo(self, video_path, start_seconds, end_seconds, threshold):
+    def compute_frame_signature(self, frame, downscale=1):
+        """
+        Compact signature of a BGR frame: a normalised 8x4x4 HSV histogram followed
+        by a 16x16 luma thumbnail scaled to 0-1
+        """
+        if downscale > 1:
+            height, width = frame.shape[:2]
+            frame = cv2.resize(frame, (max(1, width // downscale), max(1, height // downscale)),
+                               interpolation=cv2.INTER_AREA)
+        
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        hist = cv2.calcHist([hsv], [0, 1, 2], None, HISTOGRAM_BINS, [0, 180, 0, 256, 0, 256]).ravel()
+        hist /= max(hist.sum(), 1.0)
+        
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        thumbnail = cv2.resize(gray, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), interpolation=cv2.INTER_AREA)
+        
+        return np.concatenate([hist, thumbnail.ravel().astype(np.float32) / 255.0])
+
+    def signature_scores(self, signatures):
+        """
+        Cut scores (0-100) between consecutive rows of a signature matrix.
+        Averages the histogram change (half the L1 distance, the share of pixels that moved
+        to another colour bin) with the mean absolute thumbnail change.
+        """
+        signatures = np.asarray(signatures, dtype=np.float32)
+        if signatures.ndim == 1:
+            signatures = signatures[np.newaxis, :]
+        hist_bins = int(np.prod(HISTOGRAM_BINS))
+        deltas = np.abs(np.diff(signatures, axis=0))
+        hist_change = deltas[:, :hist_bins].sum(axis=1) * 0.5
+        thumbnail_change = deltas[:, hist_bins:].mean(axis=1)
+        return (hist_change + thumbnail_change) * 50.0
+
+    def signature_distance(self, signature_a, signature_b):
+        """Cut score between two frame signatures"""
+        return float(self.signature_scores([signature_a, signature_b])[0])
+
+    def find_signature_cuts(self, scores, threshold, adaptive_threshold=False):
+        """
+        Indexes of scores that are cut candidates.
+        With adaptive_threshold, a score must also stand out from its neighbours by
+        ADAPTIVE_RATIO, and scene_threshold is relaxed to half as a floor.
+        """
+        scores = np.asarray(scores, dtype=np.float32)
+        if not adaptive_threshold or len(scores) < 3:
+            return np.flatnonzero(scores > threshold)
+        
+        # Mean of the ADAPTIVE_WINDOW scores on either side, excluding the score itself
+        kernel = np.ones(2 * ADAPTIVE_WINDOW + 1, dtype=np.float32)
+        kernel[ADAPTIVE_WINDOW] = 0
+        padded = np.pad(scores, ADAPTIVE_WINDOW, mode="edge")
+        neighbour_mean = np.convolve(padded, kernel, mode="valid") / (2 * ADAPTIVE_WINDOW)
+        ratio = scores / np.maximum(neighbour_mean, 1e-3)
+        return np.flatnonzero((ratio >= ADAPTIVE_RATIO) & (scores > threshold * 0.5))
+
+    def detect_scenes_histogram(self, video_path, start_seconds, end_seconds, threshold, captured_frames=None,
+                                stride=5, refine_cuts=True, analysis_resolution="auto",
+                                adaptive_threshold=False, min_scene_gap=2.0, frame_range=None, append_end=True,
+                                score_index=None):
+        """
+        Scene detection from compact per-frame signatures (HSV histogram + luma thumbnail).
+        Signatures are collected into a preallocated array while scanning, then all cut
+        scores are computed in one vectorized pass.
+        Args:
+            threshold: Minimum cut score (0-100, roughly the percentage of the frame that changed)
+            adaptive_threshold: Require cuts to stand out from neighbouring scores, which
+                suppresses false cuts during fast camera motion
+            Other arguments as for detect_scenes_opencv
+        When cuts are refined, every frame gets a cheap signature from a strided subsample and the
+        largest change since the previous sample is tracked, so a sample that may become a cut is
+        refined without seeking back. Only the two frames around that change are kept, for capturing.
+        """
+        try:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return []
+            
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if fps <= 0:
+                fps = 30.0
+            
+            start_frame = int(start_seconds * fps)
+            end_frame = int(end_seconds * fps)
+            if frame_range:
+                start_frame, end_frame = frame_range
+            
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            end_frame = min(end_frame, total_frames - 1)
+            
+            if start_frame >= end_frame:
+                return [start_seconds]
+            
+            stride = max(1, int(stride))
+            downscale = self.get_downscale_factor(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                                  int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                                                  analysis_resolution, HISTOGRAM_AUTO_WIDTH)
+            
+            sample_count = (end_frame - start_frame) // stride + 1
+            signature_length = int(np.prod(HISTOGRAM_BINS)) + THUMBNAIL_SIZE * THUMBNAIL_SIZE
+            signatures = np.empty((sample_count, signature_length), dtype=np.float32)
+            frame_numbers = np.empty(sample_count, dtype=np.int64)
+            
+            cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+            
+            refine = self.needs_refinement(stride, refine_cuts, captured_frames)
+            # Lowest score find_signature_cuts can accept, anything above it is refined right away
+            min_cut_score = threshold * 0.5 if adaptive_threshold else threshold
+            refined_cuts = {}
+            analyse = lambda f: self.compute_frame_signature(f, downscale)
+            # Refinement only compares neighbouring frames, a subsample is enough and much cheaper to resize
+            analyse_neighbour = lambda f: self.compute_frame_signature(f[::downscale, ::downscale])
+            keep_frames = captured_frames is not None
+            # (frame_number, signature, frame) of the last decoded frame while refining
+            previous = None
+            # (score, cut_frame_number, cut_frame, end_frame) of the largest change since the previous sample
+            largest_change = None
+            
+            samples = 0
+            last_raw = None
+            current_frame = start_frame
+            
+            while current_frame <= end_frame:
+                if not cap.grab():
+                    break
+                
+                is_last = current_frame == end_frame
+                is_sample = (current_frame - start_frame) % stride == 0
+                if not is_sample and not (is_last and captured_frames is not None) and not refine:
+                    current_frame += 1
+                    continue
+                
+                ret, frame = cap.retrieve()
+                if not ret:
+                    break
+                last_raw = (current_frame, frame)
+                
+                if captured_frames is not None and not captured_frames:
+                    captured_frames[current_frame] = frame
+                
+                if refine:
+                    signature = analyse_neighbour(frame)
+                    if previous is not None:
+                        change = self.signature_distance(previous[1], signature)
+                        if largest_change is None or change > largest_change[0]:
+                            largest_change = (change, current_frame, frame if keep_frames else None, previous[2])
+                    previous = (current_frame, signature, frame if keep_frames else None)
+                
+                if is_sample and samples < sample_count:
+                    signatures[samples] = analyse(frame)
+                    frame_numbers[samples] = current_frame
+                    # largest_change covers every frame from the previous sample up to this one
+                    if refine and samples > 0 and largest_change is not None and \
+                            self.signature_distance(signatures[samples - 1], signatures[samples]) > min_cut_score:
+                        refined_cuts[current_frame] = largest_change[1:]
+                    largest_change = None
+                    samples += 1
+                
+                current_frame += 1
+            
+            signatures = signatures[:samples]
+            frame_numbers = frame_numbers[:samples]
+            
+            scores = self.signature_scores(signatures) if samples > 1 else np.empty(0, dtype=np.float32)
+            candidates = self.find_signature_cuts(scores, threshold, adaptive_threshold)
+            
+            if score_index is not None:
+                score_index.update(frame_numbers=frame_numbers[1:], scores=scores, stride=stride,
+                                   start_frame=start_frame, end_frame=end_frame)
+            
+            scene_timestamps = self.select_cuts(
+                cap,
+                [(int(frame_numbers[i]), int(frame_numbers[i + 1]), signatures[i + 1], None) for i in candidates],
+                start_seconds, fps, min_scene_gap, refine, analyse, self.signature_distance,
+                captured_frames, refined_cuts)
+            
+            cap.release()
+            
+            # The last decoded frame closes the final scene
+            if captured_frames is not None and last_raw is not None:
+                captured_frames[last_raw[0]] = last_raw[1]
+            
+            if append_end and scene_timestamps and (end_seconds - scene_timestamps[-1]) > 3.0:
+                scene_timestamps.append(min(end_seconds, (total_frames - 1) / fps))
+            
+            print(f"Histogram detection analysed {samples} frames, found {len(scene_timestamps)} scenes")
+            return scene_timestamps
+            
+        except Exception as e:
+            print(f"Histogram scene detection error: {e}")
+            return [start_seconds]
+
+    def detect_scenes_parallel(self, detector, video_path, start_seconds, end_seconds, threshold, workers,
+                               captured_frames=None, stride=5, refine_cuts=True, min_scene_gap=2.0,
+                               score_index=None, **detector_kwargs):
+        """
+        Scene detection split into overlapping chunks that run concurrently.
+        Each chunk has its own VideoCapture on a worker thread; decoding and the OpenCV
+        image operations release the GIL, so chunks run on separate cores.
+        Chunks only collect per-frame scores. Cuts are selected from the merged scores,
+        so the minimum gap is applied before any cut is refined or captured.
+        Args:
+            detector: detect_scenes_opencv or detect_scenes_histogram
+            workers: Number of chunks/threads to use
+            score_index: Optional dict filled with the merged per-frame scores of all chunks
+            detector_kwargs: Extra arguments passed to the detector
+        """
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            return []
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        if fps <= 0:
+            fps = 30.0
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        
+        stride = max(1, int(stride))
+        start_frame = int(start_seconds * fps)
+        end_frame = min(int(end_seconds * fps), total_frames - 1)
+        
+        # Chunks shorter than ~10s are not worth the extra seeks
+        span = end_frame - start_frame
+        chunk_count = min(workers, span // max(1, int(fps * 10)))
+        if chunk_count <= 1:
+            return detector(video_path, start_seconds, end_seconds, threshold,
+                            captured_frames=captured_frames, stride=stride, refine_cuts=refine_cuts,
+                            min_scene_gap=min_scene_gap, score_index=score_index, **detector_kwargs)
+        
+        # Chunk boundaries stay on the stride grid so the same frames are analysed as in a serial scan
+        chunk_length = -(-span // chunk_count)
+        chunk_length = -(-chunk_length // stride) * stride
+        # Enough analysed frames before and after each chunk for the detectors' comparison windows
+        overlap = 4 * stride
+        
+        chunks = []
+        for chunk_start in range(start_frame, end_frame + 1, chunk_length):
+            owned_end = min(chunk_start + chunk_length, end_frame + 1)
+            scan_start = max(start_frame, chunk_start - overlap)
+            chunks.append((chunk_start, owned_end, scan_start))
+        
+        print(f"Parallel detection: {len(chunks)} chunks of ~{chunk_length / fps:.1f}s on {workers} workers")
+        
+        def detect_chunk(chunk):
+            chunk_start, owned_end, scan_start = chunk
+            chunk_index = {}
+            scan_end = min(owned_end + overlap, end_frame)
+            # The first and last chunk capture the frames opening and closing the range
+            is_first, is_last = scan_start == start_frame, scan_end == end_frame
+            edge_frames = {} if captured_frames is not None and (is_first or is_last) else None
+            # Only the scores are kept, nothing is refined or captured for cuts that may be dropped
+            detector(video_path, scan_start / fps, scan_end / fps, threshold, captured_frames=edge_frames,
+                     stride=stride, refine_cuts=False, min_scene_gap=0.0, frame_range=(scan_start, scan_end),
+                     append_end=False, score_index=chunk_index, **detector_kwargs)
+            if edge_frames:
+                edges = ([min(edge_frames)] if is_first else []) + ([max(edge_frames)] if is_last else [])
+                for frame_number in edges:
+                    captured_frames[frame_number] = edge_frames[frame_number]
+            if not chunk_index:
+                return None
+            # Scores in the overlaps belong to the neighbouring chunks
+            owned = (chunk_index["frame_numbers"] >= chunk_start) & (chunk_index["frame_numbers"] < owned_end)
+            return chunk_index["frame_numbers"][owned], chunk_index["scores"][owned]
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            parts = [part for part in executor.map(detect_chunk, chunks) if part]
+        
+        if not parts:
+            return [start_seconds]
+        
+        if score_index is None:
+            score_index = {}
+        score_index.update(frame_numbers=np.concatenate([p[0] for p in parts]),
+                           scores=np.concatenate([p[1] for p in parts]), stride=stride,
+                           start_frame=start_frame, end_frame=end_frame)
+        
+        # Cuts are selected in time order with the minimum gap, then only the accepted ones
+        # are refined and captured
+        scene_detection_method = "histogram" if detector == self.detect_scenes_histogram else "opencv"
+        return self.detect_scenes_from_index(score_index, scene_detection_method, video_path, start_seconds,
+                                             end_seconds, threshold, captured_frames=captured_frames,
+                                             refine_cuts=refine_cuts, min_scene_gap=min_scene_gap,
+                                             **detector_kwargs)
+
+    def get_video_hash(self, video_path):
+        """Content fingerprint of the video, memoised on disk until the file changes"""
+        return video_fingerprint.get_fingerprint(video_path)
+
+    def get_score_index_path(self, scene_output_dir, video_path, scene_detection_method,
+                             analysis_resolution, stride):
+        """Path of the score index for a video and the settings that change its scores"""
+        index_dir = os.path.join(scene_output_dir, "scene_index")
+        index_name = (f"{self.get_video_hash(video_path)}_{scene_detection_method}_"
+                      f"{analysis_resolution}_s{max(1, int(stride))}.npz")
+        return os.path.join(index_dir, index_name)
+
+    def load_score_index(self, index_path, start_frame, end_frame):
+        """Load a score index if it covers the requested frame range"""
+        if not os.path.exists(index_path):
+            return None
+        
+        try:
+            with np.load(index_path) as data:
+                score_index = {key: data[key] for key in data.files}
+            
+            if int(score_index["start_frame"]) > start_frame or int(score_index["end_frame"]) < end_frame:
+                print(f"Score index does not cover frames {start_frame}-{end_frame}, rescanning")
+                return None
+            
+            print(f"Loaded score index: {index_path} ({len(score_index['scores'])} scores)")
+            return score_index
+            
+        except Exception as e:
+            print(f"Error loading score index: {e}")
+            return None
+
+    def save_score_index(self, index_path, score_index):
+        """Save the per-frame scores collected during detection"""
+        if not score_index or "scores" not in score_index:
+            return
+        
+        try:
+            os.makedirs(os.path.dirname(index_path), exist_ok=True)
+            # np.savez appends .npz to names without it, write to a temp name that keeps the suffix
+            temp_path = index_path[:-len(".npz")] + ".tmp.npz"
+            np.savez(temp_path, **score_index)
+            os.replace(temp_path, index_path)
+            print(f"Score index saved to: {index_path}")
+        except Exception as e:
+            print(f"Error saving score index: {e}")
+
+    def detect_scenes_from_index(self, score_index, scene_detection_method, video_path, start_seconds,
+                                 end_seconds, threshold, captured_frames=None, refine_cuts=True,
+                                 analysis_resolution="auto", adaptive_threshold=False, min_scene_gap=2.0,
+                                 **kwargs):
+        """
+        Re-derive scene cuts from stored per-frame scores, so a new threshold only needs
+        the frames around cuts decoded (for refinement and capture) instead of a full scan
+        Args:
+            score_index: Dict loaded by load_score_index
+            scene_detection_method: "opencv" or "histogram", selects how scores are thresholded
+            Other arguments as for detect_scenes_opencv/detect_scenes_histogram
+        """
+        try:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                return []
+            
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            if fps <= 0:
+                fps = 30.0
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            start_frame = int(start_seconds * fps)
+            end_frame = min(int(end_seconds * fps), total_frames - 1)
+            
+            stride = int(score_index["stride"])
+            frame_numbers = score_index["frame_numbers"]
+            scores = score_index["scores"]
+            
+            # The first frame of a fresh scan has nothing to be compared against
+            in_range = (frame_numbers > start_frame) & (frame_numbers <= end_frame)
+            frame_numbers = frame_numbers[in_range]
+            scores = scores[in_range]
+            
+            auto_width = HISTOGRAM_AUTO_WIDTH if scene_detection_method == "histogram" else None
+            downscale = self.get_downscale_factor(int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                                                  int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                                                  analysis_resolution, auto_width)
+            
+            if scene_detection_method == "histogram":
+                candidates = self.find_signature_cuts(scores, threshold, adaptive_threshold)
+                analyse = lambda f: self.compute_frame_signature(f, downscale)
+                compare = self.signature_distance
+            else:
+                candidates = np.flatnonzero(scores > threshold / 1000)
+                analyse = lambda f: self.prepare_analysis_frame(f, downscale)
+                compare = self.frame_difference
+            
+            scene_timestamps = self.select_cuts(
+                cap,
+                [(int(frame_numbers[i]) - stride, int(frame_numbers[i]), None, float(scores[i])) for i in candidates],
+                start_seconds, fps, min_scene_gap,
+                self.needs_refinement(stride, refine_cuts, captured_frames),
+                analyse, compare, captured_frames)
+            
+            cap.release()
+            
+            print(f"Score index: {len(candidates)} cut candidates above threshold {threshold}")
+            
+            if scene_timestamps and (end_seconds - scene_timestamps[-1]) > 3.0:
+                scene_timestamps.append(min(end_seconds, (total_frames - 1) / fps))
+            
+            return scene_timestamps
+            
+        except Exception as e:
+            print(f"Score index detection error: {e}")
+            return [start_seconds]
+
+    def detect_scenes_pyscene_openvideo(self, video_path, start_seconds, end_seconds, threshold,
+                                        analysis_resolution="auto"):
         """Scene detection using PySceneDetect open_video method"""
         try:
             from scenedetect import open_video, SceneManager
@@ -907,6 +2912,7 @@ class VideoSceneGenerationNode:
             # Create scene manager and add detector
             sm = SceneManager()
             sm.add_detector(ContentDetector(threshold=threshold))
+            self.apply_pyscene_downscale(sm, video_stream.frame_size, analysis_resolution)
             
             # Detect scenes
             sm.detect_scenes(video=video_stream)
@@ -950,7 +2956,8 @@ class VideoSceneGenerationNode:
             print(f"PySceneDetect OpenVideo scene detection error: {e}")
             return [start_seconds]
 
-    def detect_scenes_pyscene_videomanager(self, video_path, start_seconds, end_seconds, threshold):
+    def detect_scenes_pyscene_videomanager(self, video_path, start_seconds, end_seconds, threshold,
+                                           analysis_resolution="auto"):
         """Scene detection using PySceneDetect VideoManager method"""
         try:
             from scenedetect import VideoManager, SceneManager
@@ -962,6 +2969,7 @@ class VideoSceneGenerationNode:
             
             vm.start()
             fps = vm.get_framerate()
+            frame_size = vm.get_framesize()
             vm.release()
             
             # Recreate video manager with time range settings
@@ -988,6 +2996,7 @@ class VideoSceneGenerationNode:
             # Create scene manager and add detector
             sm = SceneManager()
             sm.add_detector(ContentDetector(threshold=threshold))
+            self.apply_pyscene_downscale(sm, frame_size, analysis_resolution)
             
             # Detect scenes
             vm.start()
@@ -1015,28 +3024,205 @@ class VideoSceneGenerationNode:
             print(f"PySceneDetect VideoManager scene detection error: {e}")
             return [start_seconds]
 
-    def extract_frame(self, video_path, timestamp, output_path):
-        """Extract a frame at timestamp"""
-        try:
-            cap = cv2.VideoCapture(video_path)
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            if fps <= 0:
-                fps = 30
-            
-            frame_number = int(timestamp * fps)
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
-            
-            ret, frame = cap.read()
-            if ret:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                Image.fromarray(frame_rgb).save(output_path, 'PNG')
-                print(f"  Saved: {os.path.basename(output_path)}")
+    def get_video_fps(self, video_path):
+        """Get video FPS, defaulting to 30 if unknown"""
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.release()
+        return fps if fps > 0 else 30.0
+
+    def get_frame_count(self, video_path):
+        """Get the number of frames in a video"""
+        cap = cv2.VideoCapture(video_path)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        return frame_count
+
+    def get_frame_number(self, timestamp, fps):
+        """Convert a timestamp to the nearest frame number"""
+        return int(round(timestamp * fps))
+
+    def get_scene_end_timestamps(self, scene_timestamps, fps, end_seconds):
+        """Each scene ends 1 frame before the next one starts, the last one at end_seconds"""
+        scene_end_timestamps = []
+        for i in range(len(scene_timestamps)):
+            if i < len(scene_timestamps) - 1:
+                # Set end timestamp to 1 frame before next scene starts
+                scene_end_timestamps.append(scene_timestamps[i + 1] - 1.0 / fps)
             else:
-                print(f"  Warning: Could not extract frame at {timestamp}s")
-            
-            cap.release()
+                # Last scene ends at video end or specified end time
+                scene_end_timestamps.append(end_seconds)
+        return scene_end_timestamps
+
+    def iter_streamed_scenes(self, cut_queue, detection, start_seconds, end_seconds, fps):
+        """
+        Yield (start, end) of each scene while detection is still running: a scene is
+        complete once the next cut arrives on cut_queue (None ends the stream).
+        The remaining scenes come from the final timestamps in detection["timestamps"].
+        Sets detection["scene_timestamps"] and ["scene_end_timestamps"] when done.
+        """
+        starts = [start_seconds]
+        while True:
+            cut_time = cut_queue.get()
+            if cut_time is None:
+                break
+            starts.append(cut_time)
+            yield starts[-2], cut_time - 1.0 / fps
+        
+        scene_timestamps = detection.get("timestamps") or starts
+        if scene_timestamps[:len(starts)] != starts:
+            # Scenes already written stay as they are
+            print("Warning: final scene list differs from the streamed cuts, keeping the streamed cuts")
+            scene_timestamps = starts
+        scene_end_timestamps = self.get_scene_end_timestamps(scene_timestamps, fps, end_seconds)
+        
+        for i in range(len(starts) - 1, len(scene_timestamps)):
+            yield scene_timestamps[i], scene_end_timestamps[i]
+        
+        detection["scene_timestamps"] = scene_timestamps
+        detection["scene_end_timestamps"] = scene_end_timestamps
+
+    def write_scene_frame(self, timestamp, output_path, fps, captured_frames, pending_frames, writer, progress=None,
+                          on_written=None, release=True):
+        """
+        Write a scene frame using a frame captured during detection when available,
+        otherwise queue it in pending_frames for extract_frames.
+        With progress records, frames completed by an earlier run are kept.
+        on_written(output_path) is called once a kept or captured frame is on disk.
+        With release, the captured frame is dropped once it is handed to the writer, so
+        captured frames don't pile up over a long run.
+        """
+        frame_number = self.get_frame_number(timestamp, fps)
+        frame = None
+        if captured_frames:
+            frame = captured_frames.pop(frame_number, None) if release else captured_frames.get(frame_number)
+        
+        if progress is not None and self.is_output_complete(progress, "frames", output_path):
+            print(f"  Keeping: {os.path.basename(output_path)}")
+            if on_written:
+                on_written(output_path)
+            return
+        
+        if frame is not None:
+            writer.submit(frame, output_path, on_written)
+        else:
+            pending_frames.setdefault(frame_number, []).append(output_path)
+
+    def extract_frames(self, video_path, frame_jobs, index_dir=None, writer=None):
+        """
+        Extract many frames in one pass over the video
+        Args:
+            frame_jobs: {frame_number: [output paths]}
+            index_dir: Directory caching the video's keyframe index
+            writer: FrameWriter saving the frames, a PNG writer is used when not given
+        """
+        print(f"Decoding {len(frame_jobs)} frames from the video...")
+        own_writer = writer is None
+        if own_writer:
+            writer = FrameWriter()
+        
+        written = set()
+        try:
+            for frame_number, frame in read_frames(video_path, list(frame_jobs), index_dir):
+                for output_path in frame_jobs[frame_number]:
+                    writer.submit(frame, output_path)
+                written.add(frame_number)
         except Exception as e:
-            print(f"Error extracting frame: {e}")
+            print(f"Error extracting frames: {e}")
+        finally:
+            if own_writer:
+                writer.close()
+        
+        for frame_number in sorted(set(frame_jobs) - written):
+            print(f"  Warning: Could not extract frame {frame_number}")
+
+    def extract_frames_ffmpeg(self, video_path, frame_jobs, work_dir, writer=None):
+        """
+        Extract many frames with ffmpeg select runs of up to FFMPEG_SELECT_BATCH frames.
+        Each run seeks to the keyframe before its first frame, and the images are matched
+        to frames by their timestamps, so a frame the decoder drops can't shift the others.
+        Args:
+            frame_jobs: {frame_number: [output paths]}
+            work_dir: Directory for ffmpeg's temporary output
+            writer: FrameWriter whose image format and settings ffmpeg should match
+        Returns:
+            The frame_jobs entries that could not be extracted
+        """
+        frame_numbers = sorted(frame_jobs)
+        remaining = dict(frame_jobs)
+        image_ext = writer.extension if writer else "png"
+        encoder_args = writer.ffmpeg_args() if writer else []
+        temp_dir = os.path.join(work_dir, f".frames_{os.getpid()}")
+        fps = self.get_video_fps(video_path)
+        # Frame numbers count from the first video frame, timestamps from the container start
+        start_offset = probe_video_start_offset(video_path)
+        
+        try:
+            os.makedirs(temp_dir, exist_ok=True)
+            for batch_start in range(0, len(frame_numbers), FFMPEG_SELECT_BATCH):
+                batch = frame_numbers[batch_start:batch_start + FFMPEG_SELECT_BATCH]
+                # Input seeking decodes from the keyframe before this time, timestamps are then
+                # relative to it
+                seek_time = round(max(0.0, (batch[0] - 0.5) / fps + start_offset), 6)
+                time_offset = start_offset - seek_time
+                select = "+".join(f"between(t\\,{(n - 0.5) / fps + time_offset:.6f}\\,"
+                                  f"{(n + 0.5) / fps + time_offset:.6f})" for n in batch)
+                # Passed as a file, the expression would not fit on a Windows command line
+                filter_path = os.path.join(temp_dir, "select.txt")
+                with open(filter_path, 'w') as f:
+                    f.write(f"select='{select}',showinfo")
+                output_pattern = os.path.join(temp_dir, f"frame_%06d.{image_ext}")
+                
+                print(f"Extracting {len(batch)} frames with ffmpeg...")
+                cmd = [
+                    'ffmpeg', '-y', '-hide_banner', '-nostats', '-v', 'info',
+                    *(['-ss', f"{seek_time:.6f}"] if seek_time > 0 else []),
+                    '-i', video_path,
+                    '-map', '0:v:0',
+                    '-filter_script:v', filter_path,
+                    '-vsync', '0',
+                    # Stop decoding once the last selected frame has been written
+                    '-frames:v', str(len(batch)),
+                    *encoder_args,
+                    '-f', 'image2',
+                    output_pattern
+                ]
+                result = subprocess.run(cmd, capture_output=True, text=True)
+                if result.returncode != 0:
+                    print(f"FFmpeg frame extraction error: {result.stderr.strip().splitlines()[-1:]}")
+                    break
+                
+                # Output images are numbered from 1 in the order showinfo logged them
+                for i, frame_number in enumerate(self.parse_showinfo_frames(result.stderr, fps, -time_offset)):
+                    temp_path = output_pattern % (i + 1)
+                    if frame_number not in remaining or not os.path.exists(temp_path):
+                        continue
+                    output_paths = remaining.pop(frame_number)
+                    for output_path in output_paths[1:]:
+                        shutil.copy2(temp_path, output_path)
+                    os.replace(temp_path, output_paths[0])
+                    print(f"  Saved: {os.path.basename(output_paths[0])}")
+                
+        except Exception as e:
+            print(f"Error extracting frames with ffmpeg: {e}")
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        return remaining
+
+    def parse_showinfo_frames(self, log, fps, time_offset):
+        """Frame numbers of the frames in an ffmpeg showinfo log, from their timestamps plus time_offset"""
+        time_base = re.search(r"config in time_base: (\d+)/(\d+)", log)
+        if not time_base:
+            return []
+        time_base = int(time_base.group(1)) / int(time_base.group(2))
+        return [int(round((int(pts) * time_base + time_offset) * fps))
+                for pts in re.findall(r"\bn:\s*\d+\s+pts:\s*(-?\d+)", log)]
+
+    def extract_frame(self, video_path, timestamp, output_path, index_dir=None, writer=None):
+        """Extract a frame at timestamp"""
+        fps = self.get_video_fps(video_path)
+        self.extract_frames(video_path, {self.get_frame_number(timestamp, fps): [output_path]}, index_dir, writer)
 
 # Register the node
 NODE_CLASS_MAPPINGS = {
@@ -0,0 +1,107 @@
+# cache_gc.py - Keeps scene output directories within a disk budget by removing least recently used runs
+import os
+
+import folder_paths
+
+from . import scene_catalog
+
+# Budget used by the API route when none is given (0 = no default, a budget must be passed)
+DEFAULT_CACHE_BUDGET_GB = float(os.environ.get("VIDEO_SCENE_CACHE_BUDGET_GB", 0))
+
+# How deep below the output directory catalogs are looked for (scene_outputs/<name>/scene_captions)
+CATALOG_SEARCH_DEPTH = 3
+
+
+def find_catalog_dirs(root=None, max_depth=CATALOG_SEARCH_DEPTH):
+    """Directories below root (the ComfyUI output directory by default) holding a scene catalog"""
+    root = os.path.abspath(root or folder_paths.get_output_directory())
+    found = []
+
+    def scan(directory, depth):
+        try:
+            with os.scandir(directory) as entries:
+                subdirectories = []
+                for entry in entries:
+                    if entry.name == scene_catalog.CATALOG_FILE and entry.is_file():
+                        found.append(directory)
+                    elif entry.is_dir(follow_symlinks=False):
+                        subdirectories.append(entry.path)
+        except OSError:
+            return
+        if depth < max_depth:
+            for subdirectory in subdirectories:
+                scan(subdirectory, depth + 1)
+
+    scan(root, 0)
+    return found
+
+
+def collect_garbage(budget_bytes, output_dirs=None, keep=(), dry_run=False):
+    """
+    Remove the least recently used runs in output_dirs (every catalog below the
+    ComfyUI output directory when None) until their files fit in budget_bytes.
+    An empty list removes nothing.
+    Files shared with a run that is kept (e.g. frames reused by a run with another
+    video codec) stay on disk. keep lists (output_dir, run_key) pairs never removed.
+    Returns a report of the sizes and the removed runs.
+    """
+    if output_dirs is None:
+        output_dirs = find_catalog_dirs()
+    output_dirs = [os.path.abspath(d) for d in output_dirs]
+    keep = {(os.path.abspath(d), key) for d, key in keep}
+
+    runs = []
+    for output_dir in output_dirs:
+        for run_key, last_used, paths in scene_catalog.list_runs(output_dir):
+            # Only files inside the run's own directory are ever removed
+            paths = [p for p in paths if os.path.abspath(p).startswith(output_dir + os.sep)]
+            runs.append({"output_dir": output_dir, "run_key": run_key, "last_used": last_used or 0, "paths": paths})
+
+    stats = scene_catalog.scan_files({path for run in runs for path in run["paths"]})
+    sizes = {path: stat[0] for path, stat in stats.items() if stat}
+    users = {}
+    for run in runs:
+        for path in run["paths"]:
+            users.setdefault(path, set()).add((run["output_dir"], run["run_key"]))
+
+    total = sum(sizes.values())
+    report = {"budget_bytes": budget_bytes, "total_bytes": total, "freed_bytes": 0, "evicted": [],
+              "dry_run": dry_run}
+
+    for run in sorted(runs, key=lambda run: run["last_used"]):
+        if total <= budget_bytes:
+            break
+        run_id = (run["output_dir"], run["run_key"])
+        if run_id in keep:
+            continue
+
+        exclusive = []
+        for path in run["paths"]:
+            users[path].discard(run_id)
+            if not users[path] and path in sizes:
+                exclusive.append(path)
+        freed = sum(sizes[path] for path in exclusive)
+
+        if not dry_run:
+            deleted = []
+            for path in exclusive:
+                try:
+                    os.remove(path)
+                    deleted.append(path)
+                except OSError as e:
+                    print(f"Error removing {path}: {e}")
+            progress_path = os.path.join(run["output_dir"], f"progress_{run['run_key']}.json")
+            if os.path.exists(progress_path):
+                os.remove(progress_path)
+            scene_catalog.delete_run(run["output_dir"], run["run_key"], deleted)
+
+        total -= freed
+        report["freed_bytes"] += freed
+        report["evicted"].append({"output_dir": run["output_dir"], "run_key": run["run_key"],
+                                  "files": len(exclusive), "bytes": freed})
+
+    report["remaining_bytes"] = total
+    action = "Would remove" if dry_run else "Removed"
+    print(f"Cache GC: {action} {len(report['evicted'])} run(s), {report['freed_bytes'] / 1024 ** 2:.1f} MB freed, "
+          f"{total / 1024 ** 2:.1f} MB of {budget_bytes / 1024 ** 2:.1f} MB budget used")
+    return report
@@ -0,0 +1,77 @@
+# caption_store.py - Persistent caption store keyed by image content, shared by the scene nodes
+import os
+import hashlib
+import sqlite3
+import threading
+
+import folder_paths
+
+# Captions are stored in the ComfyUI output directory, independent of the nodes' output_dir
+STORE_DIR = "scene_cache"
+STORE_FILE = "captions.sqlite"
+
+_lock = threading.Lock()
+_connection = None
+
+
+def get_store_path():
+    return os.path.join(folder_paths.get_output_directory(), STORE_DIR, STORE_FILE)
+
+
+def _connect():
+    """Open the store once per process, None if it can't be opened"""
+    global _connection
+    if _connection is None:
+        try:
+            path = get_store_path()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                "key TEXT PRIMARY KEY, image_hash TEXT, model_id TEXT, caption TEXT)")
+            connection.commit()
+            _connection = connection
+        except Exception as e:
+            print(f"Error opening caption store: {e}")
+    return _connection
+
+
+def image_hash(image):
+    """Hash of the decoded pixels of a PIL image, independent of the file format it came from"""
+    hasher = hashlib.sha1(f"{image.mode}_{image.size[0]}x{image.size[1]}".encode())
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+def get_caption_key(content_hash, model_id, prompt, max_length=0):
+    key_str = f"{content_hash}_{model_id}_{prompt}_{max_length}"
+    return hashlib.sha1(key_str.encode()).hexdigest()
+
+
+def get_caption(content_hash, model_id, prompt, max_length=0):
+    """Stored caption for this image, model, prompt and max length, or None"""
+    key = get_caption_key(content_hash, model_id, prompt, max_length)
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return None
+        try:
+            row = connection.execute("SELECT caption FROM captions WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            print(f"Error reading caption store: {e}")
+            return None
+    return row[0] if row else None
+
+
+def put_caption(content_hash, model_id, prompt, caption, max_length=0):
+    key = get_caption_key(content_hash, model_id, prompt, max_length)
+    with _lock:
+        connection = _connect()
+        if connection is None:
+            return
+        try:
+            connection.execute("INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?)",
+                               (key, content_hash, model_id, caption))
+            connection.commit()
+        except Exception as e:
+            print(f"Error writing caption store: {e}")
@@ -0,0 +1,116 @@
+# cpu_inference.py - CPU tuning for the captioning models when no GPU is available
+import os
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+CPU_PRECISIONS = ["float32", "bfloat16", "int8"]
+
+# Fixed fixture used for warm-up and the captions/s measurement
+FIXTURE_SIZE = 378
+FIXTURE_IMAGES = 3
+
+
+def configure_threads(threads=0, interop_threads=0):
+    """
+    Set the intra-op and inter-op thread counts. 0 uses half the logical cores (about
+    the physical cores) for intra-op and 1 inter-op thread, as captioning runs one
+    model call at a time. The inter-op count can only be set once per process.
+    """
+    cores = os.cpu_count() or 1
+    torch.set_num_threads(threads or max(1, cores // 2))
+    try:
+        torch.set_num_interop_threads(interop_threads or 1)
+    except RuntimeError:
+        pass  # Already set, or parallel work has started
+
+
+def bfloat16_supported():
+    """Whether the CPU has native bfloat16 support (AVX512-BF16 or AMX)"""
+    try:
+        return bool(torch.ops.mkldnn._is_mkldnn_bf16_supported())
+    except Exception:
+        return False
+
+
+def get_cpu_dtype(precision):
+    """dtype to load a model with for the CPU precision"""
+    if precision == "bfloat16":
+        if bfloat16_supported():
+            return torch.bfloat16
+        print("bfloat16 is not supported by this CPU, using float32")
+    return torch.float32
+
+
+def prepare_model(model, precision, check=None):
+    """
+    Apply the CPU precision to a loaded model. int8 quantizes the Linear layers
+    dynamically (weights int8, activations quantized per batch); if check(model)
+    raises on the quantized model, the float model is kept.
+    """
+    model.eval()
+    if precision != "int8":
+        return model
+
+    try:
+        quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        if check:
+            with torch.inference_mode():
+                check(quantized)
+        print("Quantized Linear layers to int8")
+        return quantized
+    except Exception as e:
+        print(f"int8 quantization is not usable for this model ({e}), keeping float32")
+        return model
+
+
+def fixture_images(count=FIXTURE_IMAGES, size=FIXTURE_SIZE):
+    """Deterministic test images: gradients with a few flat shapes"""
+    y, x = np.mgrid[0:size, 0:size]
+    images = []
+    for i in range(count):
+        image = np.stack([(x + 40 * i) % 256, (y * 2 + 60 * i) % 256, ((x + y) // 2 + 90 * i) % 256], axis=-1)
+        quarter = size // 4
+        image[quarter:2 * quarter, quarter * (i % 3):quarter * (i % 3 + 1)] = (255, 255, 255)
+        images.append(Image.fromarray(image.astype(np.uint8)))
+    return images
+
+
+def measure_throughput(caption_image, images=None):
+    """
+    Caption the fixture with caption_image(image): the first image warms up (lazy
+    initialisation, oneDNN kernel selection) and the rest are timed.
+    Returns captions per second, or None if captioning fails.
+    """
+    images = images or fixture_images()
+    try:
+        with torch.inference_mode():
+            caption_image(images[0])
+            start = time.perf_counter()
+            for image in images[1:]:
+                caption_image(image)
+            elapsed = time.perf_counter() - start
+    except Exception as e:
+        print(f"Warm-up failed: {e}")
+        return None
+    return (len(images) - 1) / elapsed if elapsed > 0 else None
+
+
+def get_model_key(model_id, device, precision="float32"):
+    """Model registry key, CPU models are kept per precision"""
+    if device.type == "cuda":
+        return model_id
+    return f"{model_id}:cpu-{precision}"
+
+
+def throughput_warmup(caption_image):
+    """Registry warm-up: caption the fixture and report captions/s"""
+    def warmup(models):
+        rate = measure_throughput(lambda image: caption_image(models, image))
+        if rate is None:
+            return {}
+        print(f"CPU caption throughput: {rate:.3f} captions/s (threads: {torch.get_num_threads()})")
+        return {"captions_per_second": round(rate, 4), "threads": torch.get_num_threads()}
+    return warmup
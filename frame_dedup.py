@@ -0,0 +1,103 @@
+# frame_dedup.py - Perceptual hashing to caption near-identical frames only once
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# dHash grid, 8x8 = 64 bit hashes
+HASH_SIZE = 8
+
+# Default Hamming distance (of 64 bits) below which two frames count as the same shot
+DEFAULT_DEDUP_THRESHOLD = 4
+
+# dHash only sees gradients, so flat frames (black, white, a plain title card) all hash to 0;
+# frames also need a similar mean brightness (0-255) to be merged
+BRIGHTNESS_TOLERANCE = 12
+
+_BIT_WEIGHTS = (1 << np.arange(HASH_SIZE * HASH_SIZE, dtype=np.uint64)).astype(np.uint64)
+
+
+def hash_thumbnail(image):
+    """Grayscale (HASH_SIZE+1) x HASH_SIZE thumbnail of a PIL image used for hashing"""
+    image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))  # Lets JPEG decode at reduced size
+    thumbnail = image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR)
+    return np.asarray(thumbnail, dtype=np.int16)
+
+
+def dhash_thumbnails(thumbnails):
+    """
+    dHash of a stack of thumbnails in one vectorized pass.
+    Returns (uint64 hashes, mean brightness) arrays.
+    """
+    stack = np.stack(thumbnails)
+    bits = (stack[:, :, 1:] > stack[:, :, :-1]).reshape(len(stack), -1).astype(np.uint64)
+    hashes = (bits * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)
+    return hashes, stack.mean(axis=(1, 2))
+
+
+def dhash_images(images):
+    """dHash and mean brightness of PIL images"""
+    if not images:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0)
+    return dhash_thumbnails([hash_thumbnail(image) for image in images])
+
+
+def dhash_files(image_paths, workers=4):
+    """
+    dHash and mean brightness of image files, decoded on a small thread pool.
+    Files that can't be read get a None thumbnail and are reported in the returned
+    list of valid flags.
+    """
+    def load(path):
+        try:
+            with Image.open(path) as image:
+                return hash_thumbnail(image)
+        except Exception as e:
+            print(f"Error hashing {path}: {e}")
+            return None
+
+    if not image_paths:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0), []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        thumbnails = list(executor.map(load, image_paths))
+
+    valid = [thumbnail is not None for thumbnail in thumbnails]
+    blank = np.zeros((HASH_SIZE, HASH_SIZE + 1), dtype=np.int16)
+    hashes, brightness = dhash_thumbnails([t if t is not None else blank for t in thumbnails])
+    return hashes, brightness, valid
+
+
+def hamming_distances(hash_value, hashes):
+    """Hamming distance between one hash and an array of hashes"""
+    diff = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(hash_value))
+    return np.unpackbits(diff.view(np.uint8).reshape(len(diff), 8), axis=1).sum(axis=1)
+
+
+def find_match(hash_value, brightness, rep_hashes, rep_brightness, threshold=DEFAULT_DEDUP_THRESHOLD):
+    """Index of the closest representative within threshold, or -1"""
+    if not len(rep_hashes):
+        return -1
+    distances = hamming_distances(hash_value, rep_hashes)
+    distances[np.abs(np.asarray(rep_brightness) - brightness) > BRIGHTNESS_TOLERANCE] = HASH_SIZE * HASH_SIZE + 1
+    best = int(np.argmin(distances))
+    return best if distances[best] <= threshold else -1
+
+
+def cluster_hashes(hashes, brightness, threshold=DEFAULT_DEDUP_THRESHOLD):
+    """
+    Group near-identical frames. Each frame joins the first earlier representative
+    within threshold, otherwise it becomes a representative itself, so frames are
+    never chained into clusters wider than the threshold.
+    Returns the representative index of each frame.
+    """
+    representatives = []
+    assignments = []
+    for i, (hash_value, value) in enumerate(zip(hashes, brightness)):
+        match = find_match(hash_value, value, hashes[representatives], brightness[representatives], threshold)
+        if match < 0:
+            representatives.append(i)
+            assignments.append(i)
+        else:
+            assignments.append(representatives[match])
+    return assignments
@@ -0,0 +1,242 @@
+# keyframe_index.py - Keyframe index and GOP-aware frame reading shared by the scene nodes
+import os
+import json
+import subprocess
+from bisect import bisect_left, bisect_right
+
+import cv2
+
+from . import video_fingerprint
+
+# Without a keyframe index, decode forward instead of seeking when the next
+# requested frame is at most this many frames ahead
+FORWARD_DECODE_LIMIT = 48
+
+# Keyframe indexes already loaded in this process, keyed by index key
+_keyframe_indexes = {}
+
+# Set to False once ffprobe turns out to be missing, so it isn't looked up for every video
+_ffprobe_available = True
+
+
+def get_index_key(video_path):
+    """Key identifying a video's content, shared by renamed or moved copies of the file"""
+    return video_fingerprint.get_fingerprint(video_path)
+
+
+def probe_keyframes(video_path):
+    """
+    List the frame numbers of the keyframes in the first video stream with ffprobe,
+    and whether every GOP is closed (no frame decoded after a keyframe is shown before it).
+    Only packet headers are read, nothing is decoded.
+    Returns None when ffprobe is not available or fails.
+    """
+    global _ffprobe_available
+    if not _ffprobe_available:
+        return None
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', video_path],
+            capture_output=True, text=True)
+    except FileNotFoundError:
+        print("ffprobe not found, seeking without a keyframe index")
+        _ffprobe_available = False
+        return None
+
+    if result.returncode != 0:
+        print(f"ffprobe failed: {result.stderr.strip()}")
+        return None
+
+    pts_times = []
+    keyframe_times = []
+    # Leading pictures of an open GOP follow its keyframe in decode order but are shown before it
+    closed_gops = True
+    later_min_pts = float('inf')
+    for line in reversed(result.stdout.splitlines()):
+        fields = line.strip().split(',')
+        if len(fields) < 2:
+            continue
+        try:
+            pts_time = float(fields[0])
+        except ValueError:
+            continue  # pts_time is N/A for some packets
+        pts_times.append(pts_time)
+        if 'K' in fields[1]:
+            keyframe_times.append(pts_time)
+            if later_min_pts < pts_time:
+                closed_gops = False
+        later_min_pts = min(later_min_pts, pts_time)
+
+    if not pts_times:
+        return None
+
+    # Packets are in decode order, the frame number is the position in presentation order
+    pts_times.sort()
+    keyframes = sorted({bisect_left(pts_times, t) for t in keyframe_times})
+    return {"keyframes": keyframes, "frame_count": len(pts_times), "closed_gops": closed_gops}
+
+
+def probe_video_stream(video_path):
+    """Codec name and pixel format of the first video stream, or (None, None)"""
+    if not _ffprobe_available:
+        return None, None
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=codec_name,pix_fmt', '-of', 'csv=p=0', video_path],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            print(f"ffprobe failed: {result.stderr.strip()}")
+            return None, None
+        fields = result.stdout.strip().splitlines()[0].split(',')
+        return fields[0], fields[1] if len(fields) > 1 else None
+    except (FileNotFoundError, IndexError):
+        return None, None
+
+
+def probe_video_start_offset(video_path):
+    """
+    Seconds from the container's start time to the first video frame (audio often starts
+    earlier), 0.0 when ffprobe is not available or doesn't report both.
+    """
+    if not _ffprobe_available:
+        return 0.0
+
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'format=start_time:stream=start_time', '-of', 'json', video_path],
+            capture_output=True, text=True)
+        if result.returncode != 0:
+            return 0.0
+        info = json.loads(result.stdout)
+        return max(0.0, float(info["streams"][0]["start_time"]) - float(info["format"]["start_time"]))
+    except (FileNotFoundError, ValueError, KeyError, IndexError):
+        return 0.0
+
+
+def load_index(video_path, index_dir=None):
+    """
+    Get the keyframe index of a video, probing it once and caching the result
+    in memory and, when index_dir is given, as JSON on disk.
+    Returns the index dict (keyframes, frame_count, closed_gops), or None if it can't be built.
+    """
+    try:
+        index_key = get_index_key(video_path)
+    except OSError as e:
+        print(f"Error reading video for keyframe index: {e}")
+        return None
+
+    if index_key in _keyframe_indexes:
+        return _keyframe_indexes[index_key]
+
+    index_file = os.path.join(index_dir, f"{index_key}_keyframes.json") if index_dir else None
+    index = None
+
+    if index_file and os.path.exists(index_file):
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except Exception as e:
+            print(f"Error loading keyframe index: {e}")
+        # Indexes written before the GOP check are probed again
+        if index is not None and "closed_gops" not in index:
+            index = None
+
+    if index is None:
+        index = probe_keyframes(video_path)
+        if index is None:
+            return None
+        print(f"Keyframe index: {len(index['keyframes'])} keyframes in {index['frame_count']} frames")
+
+        if index_file:
+            try:
+                os.makedirs(index_dir, exist_ok=True)
+                with open(index_file, 'w') as f:
+                    json.dump(index, f)
+            except Exception as e:
+                print(f"Error saving keyframe index: {e}")
+
+    _keyframe_indexes[index_key] = index
+    return index
+
+
+def load_keyframe_index(video_path, index_dir=None):
+    """Sorted keyframe frame numbers of a video, or None if they can't be listed"""
+    index = load_index(video_path, index_dir)
+    return (index.get("keyframes") or None) if index else None
+
+
+def has_closed_gops(video_path, index_dir=None):
+    """Whether every GOP of the video is closed, False when unknown"""
+    index = load_index(video_path, index_dir)
+    return bool(index and index.get("closed_gops"))
+
+
+def plan_frame_reads(frame_numbers, keyframes=None):
+    """
+    Order frame requests for sequential decoding.
+    Requests are sorted and grouped by GOP so frames sharing a GOP share one decode;
+    a seek (always to the GOP's keyframe) is only planned when decoding forward from
+    the current position would not reach the frame sooner.
+    Returns a list of (seek_frame, [frame numbers]) steps, frames within a step are
+    decoded forward from seek_frame without seeking again.
+    """
+    steps = []
+    position = None  # Next frame the decoder will return
+
+    for frame_number in sorted(set(frame_numbers)):
+        if keyframes:
+            gop_start = keyframes[max(0, bisect_right(keyframes, frame_number) - 1)]
+            forward = position is not None and gop_start <= position <= frame_number
+        else:
+            gop_start = frame_number
+            forward = position is not None and position <= frame_number <= position + FORWARD_DECODE_LIMIT
+
+        if forward and steps:
+            steps[-1][1].append(frame_number)
+        else:
+            steps.append((gop_start, [frame_number]))
+        position = frame_number + 1
+
+    return steps
+
+
+def read_frames(video_path, frame_numbers, index_dir=None):
+    """
+    Decode the requested frames with as few seeks as possible.
+    Seeks land on keyframes from the keyframe index and the decoder reads forward
+    from there, which is faster and more accurate than seeking to arbitrary frames.
+    Yields (frame_number, BGR frame) in ascending frame order; frames that can't be
+    decoded are skipped.
+    """
+    if not frame_numbers:
+        return
+
+    keyframes = load_keyframe_index(video_path, index_dir)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        print(f"Error opening video: {video_path}")
+        return
+
+    try:
+        position = 0
+        for seek_frame, targets in plan_frame_reads(frame_numbers, keyframes):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, seek_frame)
+            position = seek_frame
+
+            for frame_number in targets:
+                # grab() skips the colour conversion for frames we don't keep
+                while position < frame_number and cap.grab():
+                    position += 1
+                if position != frame_number or not cap.grab():
+                    break
+                position += 1
+                ret, frame = cap.retrieve()
+                if ret:
+                    yield frame_number, frame
+    finally:
+        cap.release()
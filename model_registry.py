@@ -0,0 +1,226 @@
+# model_registry.py - Process-wide registry keeping models loaded across prompts
+import os
+import gc
+import time
+import threading
+from collections import OrderedDict
+
+import torch
+
+# Models unused for this many seconds are unloaded (0 keeps them until evicted or unloaded)
+DEFAULT_IDLE_TIMEOUT = float(os.environ.get("VIDEO_SCENE_MODEL_IDLE_TIMEOUT", 600))
+
+# Total size of the loaded models in GB, least recently used models are unloaded to stay
+# below it (0 = 80% of the GPU memory on CUDA, no limit on CPU)
+DEFAULT_MEMORY_BUDGET_GB = float(os.environ.get("VIDEO_SCENE_MODEL_BUDGET_GB", 0))
+
+# How often the idle check runs
+IDLE_CHECK_INTERVAL = 30
+
+# _lock only guards the registry's dicts and is never held while a model loads or
+# memory is released, so the routes listing and unloading models don't wait on a load
+_lock = threading.RLock()
+_models = OrderedDict()  # key -> entry dict, least recently used first
+_idle_timeout = DEFAULT_IDLE_TIMEOUT
+_memory_budget = None
+_idle_thread = None
+_model_locks = {}  # key -> lock serialising inference on a shared model
+_load_locks = {}  # key -> lock held while the models under key are loaded
+_known_sizes = {}  # key -> size of the models the last time they were loaded
+
+
+def get_default_budget():
+    """Memory budget in bytes when none is configured, None for no limit"""
+    if DEFAULT_MEMORY_BUDGET_GB > 0:
+        return int(DEFAULT_MEMORY_BUDGET_GB * 1024 ** 3)
+    if torch.cuda.is_available():
+        try:
+            return int(torch.cuda.get_device_properties(0).total_memory * 0.8)
+        except Exception:
+            pass
+    return None
+
+
+def estimate_size(objects):
+    """Bytes taken by the parameters and buffers of the torch modules in objects"""
+    size = 0
+    for obj in objects:
+        if isinstance(obj, torch.nn.Module):
+            for tensor in list(obj.parameters()) + list(obj.buffers()):
+                size += tensor.numel() * tensor.element_size()
+    return size
+
+
+def set_idle_timeout(seconds):
+    """Unload models unused for this many seconds, 0 disables the idle timeout"""
+    global _idle_timeout
+    with _lock:
+        _idle_timeout = max(0, float(seconds))
+    _start_idle_thread()
+
+
+def set_memory_budget(budget_bytes):
+    """Limit the total size of the loaded models, None removes the limit"""
+    global _memory_budget
+    with _lock:
+        _memory_budget = budget_bytes
+    _evict_over_budget(0)
+
+
+def get_memory_budget():
+    with _lock:
+        if _memory_budget is None:
+            return get_default_budget()
+        return _memory_budget
+
+
+def get_model(key, loader, warmup=None):
+    """
+    Return the models registered under key, loading them with loader() if needed.
+    loader returns a tuple of objects (e.g. tokenizer and model) or None on failure;
+    failures are not cached so the next call tries again.
+    warmup(models) runs once after loading and may return a dict of details (such
+    as a measured throughput) kept with the entry and shown by list_models.
+    Concurrent calls for the same key wait for a single load; other keys load in parallel.
+    """
+    models = _use_loaded(key)
+    if models is not None:
+        return models
+
+    with _lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        # Another caller may have finished loading while this one waited
+        models = _use_loaded(key)
+        if models is not None:
+            return models
+
+        # Make room before loading, so the evicted and the new models are not in memory together.
+        # Models not loaded before are assumed to be as large as the largest one seen so far
+        with _lock:
+            expected_size = _known_sizes.get(key, max(_known_sizes.values(), default=0))
+        _evict_over_budget(expected_size)
+
+        models = loader()
+        if models is None or any(obj is None for obj in models):
+            return None
+
+        size = estimate_size(models)
+        info = (warmup(models) or {}) if warmup else {}
+        with _lock:
+            _known_sizes[key] = size
+        _evict_over_budget(size)
+        with _lock:
+            _models[key] = {"models": models, "size": size, "last_used": time.time(), "info": info}
+            loaded_count = len(_models)
+        print(f"Model registry: {key} loaded ({size / 1024 ** 3:.2f} GB, {loaded_count} model(s) loaded)")
+
+    _start_idle_thread()
+    return models
+
+
+def get_model_lock(key):
+    """Lock to hold while running a registered model, so concurrent jobs take turns"""
+    with _lock:
+        return _model_locks.setdefault(key, threading.Lock())
+
+
+def unload_model(key):
+    """Unload the models registered under key, returns True if they were loaded"""
+    with _lock:
+        entry = _models.pop(key, None)
+    if entry is None:
+        return False
+    del entry
+    _release_memory()
+    print(f"Model registry: {key} unloaded")
+    return True
+
+
+def unload_all():
+    """Unload every registered model, returns the keys that were unloaded"""
+    with _lock:
+        keys = list(_models.keys())
+        _models.clear()
+    if keys:
+        _release_memory()
+        print(f"Model registry: unloaded {', '.join(keys)}")
+    return keys
+
+
+def list_models():
+    """Key, size and idle seconds of each loaded model, least recently used first"""
+    now = time.time()
+    with _lock:
+        return [{"key": key, "size_bytes": entry["size"], "idle_seconds": round(now - entry["last_used"], 1),
+                 **entry["info"]}
+                for key, entry in _models.items()]
+
+
+def unload_idle_models():
+    """Unload models that have not been used within the idle timeout"""
+    with _lock:
+        if not _idle_timeout:
+            return []
+        cutoff = time.time() - _idle_timeout
+        keys = [key for key, entry in _models.items() if entry["last_used"] < cutoff]
+        for key in keys:
+            del _models[key]
+    if keys:
+        _release_memory()
+        print(f"Model registry: unloaded idle {', '.join(keys)}")
+    return keys
+
+
+def _use_loaded(key):
+    """Models registered under key, marked as just used, or None if they are not loaded"""
+    with _lock:
+        entry = _models.get(key)
+        if entry is None:
+            return None
+        entry["last_used"] = time.time()
+        _models.move_to_end(key)
+    print(f"Using loaded model: {key}")
+    return entry["models"]
+
+
+def _evict_over_budget(incoming_size):
+    """
+    Unload least recently used models until incoming_size more bytes fit the budget.
+    Memory is released outside _lock.
+    """
+    budget = get_memory_budget()
+    if budget is None:
+        return
+    evicted = []
+    with _lock:
+        while _models and sum(entry["size"] for entry in _models.values()) + incoming_size > budget:
+            key, _ = _models.popitem(last=False)
+            evicted.append(key)
+    if evicted:
+        _release_memory()
+        print(f"Model registry: unloaded {', '.join(evicted)} to stay within the memory budget")
+
+
+def _release_memory():
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _idle_loop():
+    while True:
+        time.sleep(IDLE_CHECK_INTERVAL)
+        try:
+            unload_idle_models()
+        except Exception as e:
+            print(f"Model registry idle check failed: {e}")
+
+
+def _start_idle_thread():
+    global _idle_thread
+    with _lock:
+        if _idle_thread is not None or not _idle_timeout:
+            return
+        _idle_thread = threading.Thread(target=_idle_loop, name="model-registry-idle", daemon=True)
+        _idle_thread.start()
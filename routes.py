@@ -1,10 +1,13 @@
 import os
 import json
+import asyncio
+import functools
 import server
 from aiohttp import web
 import folder_paths
 import mimetypes
 import urllib.parse
+from . import model_registry, scene_catalog, cache_gc
 
 def get_allowed_directories():
     """Get list of directories that can be accessed"""
@@ -84,6 +87,15 @@ def is_path_allowed(filepath, allowed_directories):
     except Exception as e:
         return False, f"Path validation error: {str(e)}"
 
+def is_directory_allowed(directory, allowed_directories):
+    """Check if a directory is one of the allowed directories or inside one"""
+    normalized_dir = os.path.normpath(directory).lower()
+    for allowed_dir in allowed_directories:
+        normalized_allowed = os.path.normpath(allowed_dir).lower()
+        if normalized_dir.startswith(normalized_allowed + os.sep) or normalized_dir == normalized_allowed:
+            return True
+    return False
+
 def get_scene_captions_dir(base_dir=None):
     """Get the scene captions directory path"""
     output_dir = folder_paths.get_output_directory()
@@ -198,6 +210,7 @@ async def save_scene_description(request):
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        scene_catalog.set_description(file_path, content.strip())
         return web.json_response({
             "message": "Description saved successfully", 
             "filename": filename,
@@ -256,6 +269,7 @@ async def caption_save_description(request):
     try:
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(content)
+        scene_catalog.set_description(file_path, content.strip())
         
         return web.json_response({
             "message": "Caption saved successfully", 
@@ -454,6 +468,7 @@ async def viewer_save_description(request):
         
         with open(abs_filepath, 'w', encoding='utf-8') as f:
             f.write(content)
+        scene_catalog.set_description(abs_filepath, content.strip())
         
         return web.json_response({
             "message": "Description saved successfully", 
@@ -720,6 +735,27 @@ async def viewer_update_description(request):
         if not parent_allowed:
             return web.Response(text="Access denied", status=403)
         
+        # Directories with a scene catalog update one row and the description file of the
+        # run the metadata file was exported from, then export that run's metadata.json again.
+        # Files exported before runs were named in them resolve to the latest run and are left as they are
+        if scene_catalog.has_catalog(parent_dir):
+            run_key = None
+            if os.path.exists(abs_metadata_file):
+                with open(abs_metadata_file, 'r') as f:
+                    run_key = json.load(f).get("run_key")
+            desc_path = scene_catalog.get_description_path(parent_dir, scene_index, run_key)
+            if not desc_path:
+                return web.Response(text="Scene not found in catalog", status=404)
+            with open(desc_path, 'w', encoding='utf-8') as f:
+                f.write(new_description + '\n')
+            scene_catalog.set_description(desc_path, new_description.strip())
+            if run_key:
+                scene_catalog.export_metadata(parent_dir, run_key, abs_metadata_file)
+            return web.json_response({
+                "success": True,
+                "message": "Description updated"
+            })
+        
         if not os.path.exists(abs_metadata_file):
             return web.Response(text="Metadata file not found", status=404)
         
@@ -911,4 +947,112 @@ async def debug_captions_dir(request):
         "captions_dir": captions_dir,
         "exists": os.path.exists(captions_dir),
         "is_dir": os.path.isdir(captions_dir) if os.path.exists(captions_dir) else False
-    })
\ No newline at end of file
+    })
+
+# ============ MODEL REGISTRY ENDPOINTS ============
+@server.PromptServer.instance.routes.get("/video_scene/models")
+async def list_loaded_models(request):
+    """List the models kept loaded by the scene nodes"""
+    return web.json_response({
+        "models": model_registry.list_models(),
+        "memory_budget": model_registry.get_memory_budget(),
+    })
+
+@server.PromptServer.instance.routes.post("/video_scene/models/unload")
+async def unload_models(request):
+    """Unload one model (JSON {"key": ...}) or all models when no key is given"""
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    
+    key = data.get("key", "")
+    if key:
+        if not model_registry.unload_model(key):
+            return web.Response(text=f"Model not loaded: {key}", status=404)
+        return web.json_response({"unloaded": [key]})
+    
+    return web.json_response({"unloaded": model_registry.unload_all()})
+
+# ============ SCENE CATALOG ENDPOINTS ============
+@server.PromptServer.instance.routes.get("/video_scene/catalog/scenes")
+async def catalog_list_scenes(request):
+    """Scenes of a run in an output directory's catalog (latest run by default) or of every run on a video"""
+    directory = urllib.parse.unquote(request.query.get("directory", ""))
+    if not directory:
+        return web.Response(text="No directory provided", status=400)
+    
+    abs_directory = os.path.abspath(os.path.normpath(os.path.expanduser(directory)))
+    if not is_directory_allowed(abs_directory, get_allowed_directories()):
+        return web.Response(text="Access denied: Directory not in allowed paths", status=403)
+    if not scene_catalog.has_catalog(abs_directory):
+        return web.json_response({"scenes": [], "error": "No scene catalog in directory"})
+    
+    try:
+        scene_index = request.query.get("scene_index", "")
+        scenes = scene_catalog.list_scenes(abs_directory,
+                                           run_key=request.query.get("run_key") or None,
+                                           video_path=urllib.parse.unquote(request.query.get("video", "")) or None,
+                                           scene_index=int(scene_index) if scene_index else None,
+                                           offset=int(request.query.get("offset", 0)),
+                                           limit=int(request.query.get("limit", 100)))
+    except (ValueError, OSError) as e:
+        return web.Response(text=f"Invalid query: {str(e)}", status=400)
+    
+    return web.json_response({"directory": abs_directory, "total_scenes": len(scenes), "scenes": scenes})
+
+@server.PromptServer.instance.routes.post("/video_scene/catalog/export")
+async def catalog_export_metadata(request):
+    """Write metadata.json for a run in an output directory's catalog (latest run by default)"""
+    try:
+        data = await request.json()
+    except:
+        return web.Response(text="Invalid JSON", status=400)
+    
+    directory = urllib.parse.unquote(data.get("directory", ""))
+    if not directory:
+        return web.Response(text="No directory provided", status=400)
+    
+    abs_directory = os.path.abspath(os.path.normpath(os.path.expanduser(directory)))
+    if not is_directory_allowed(abs_directory, get_allowed_directories()):
+        return web.Response(text="Access denied: Directory not in allowed paths", status=403)
+    
+    metadata_path = scene_catalog.export_metadata(abs_directory, data.get("run_key") or None)
+    if not metadata_path:
+        return web.Response(text="No run found in scene catalog", status=404)
+    return web.json_response({"success": True, "metadata_file": metadata_path})
+
+# ============ CACHE GC ENDPOINTS ============
+@server.PromptServer.instance.routes.post("/video_scene/cache/gc")
+async def cache_collect_garbage(request):
+    """
+    Remove least recently used runs until the scene outputs fit a byte budget.
+    Body: {"budget_gb": float, "directory": optional output directory, "dry_run": bool}
+    """
+    try:
+        data = await request.json()
+    except:
+        data = {}
+    
+    try:
+        budget_gb = float(data.get("budget_gb", cache_gc.DEFAULT_CACHE_BUDGET_GB))
+    except (TypeError, ValueError):
+        return web.Response(text="Invalid budget_gb", status=400)
+    if budget_gb <= 0:
+        return web.Response(text="No budget given (budget_gb or VIDEO_SCENE_CACHE_BUDGET_GB)", status=400)
+    
+    # Scanning and deleting files can take a while, so it runs off the event loop
+    loop = asyncio.get_running_loop()
+    output_dirs = None
+    directory = data.get("directory", "")
+    if directory:
+        abs_directory = os.path.abspath(os.path.normpath(os.path.expanduser(urllib.parse.unquote(directory))))
+        if not is_directory_allowed(abs_directory, get_allowed_directories()):
+            return web.Response(text="Access denied: Directory not in allowed paths", status=403)
+        output_dirs = await loop.run_in_executor(None, cache_gc.find_catalog_dirs, abs_directory)
+        if not output_dirs:
+            return web.json_response({"evicted": [], "error": "No scene catalog in directory"})
+    
+    report = await loop.run_in_executor(None, functools.partial(cache_gc.collect_garbage, int(budget_gb * 1024 ** 3),
+                                                                output_dirs, dry_run=bool(data.get("dry_run"))))
+    return web.json_response(report)
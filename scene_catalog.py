@@ -0,0 +1,380 @@
+# scene_catalog.py - SQLite catalog of the runs, scenes and descriptions in a scene output directory
+import os
+import json
+import time
+import sqlite3
+import threading
+
+from . import video_fingerprint
+
+CATALOG_FILE = "scene_catalog.sqlite"
+
+# Scene entries keep description text in these fields, as (sub-entry, path field, text field).
+# Texts with a path are stored as caption rows, so an edit updates one row.
+DESCRIPTION_FIELDS = [
+    ("start_frame", "description_path", "description"),
+    ("end_frame", "description_path", "description"),
+    (None, "caption_filepath", "caption"),
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id INTEGER PRIMARY KEY, fingerprint TEXT UNIQUE, path TEXT);
+CREATE TABLE IF NOT EXISTS runs (
+    run_key TEXT PRIMARY KEY, video_id INTEGER, params TEXT, metadata TEXT, created REAL, last_used REAL);
+CREATE TABLE IF NOT EXISTS scenes (
+    run_key TEXT, scene_index INTEGER, video_id INTEGER, start_time REAL, end_time REAL, data TEXT,
+    PRIMARY KEY (run_key, scene_index));
+CREATE TABLE IF NOT EXISTS frames (
+    run_key TEXT, scene_index INTEGER, kind TEXT, image_path TEXT, description_path TEXT,
+    PRIMARY KEY (run_key, scene_index, kind));
+CREATE TABLE IF NOT EXISTS clips (
+    run_key TEXT, scene_index INTEGER, video_path TEXT, PRIMARY KEY (run_key, scene_index));
+CREATE TABLE IF NOT EXISTS captions (
+    path TEXT PRIMARY KEY, caption TEXT);
+CREATE TABLE IF NOT EXISTS artifacts (
+    run_key TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, PRIMARY KEY (run_key, path));
+CREATE INDEX IF NOT EXISTS scenes_video ON scenes (video_id);
+CREATE INDEX IF NOT EXISTS scenes_index ON scenes (scene_index);
+"""
+
+_lock = threading.RLock()
+_connections = {}  # catalog path -> connection
+
+
+def get_catalog_path(output_dir):
+    return os.path.join(output_dir, CATALOG_FILE)
+
+
+def has_catalog(output_dir):
+    return os.path.exists(get_catalog_path(output_dir))
+
+
+def _connect(output_dir):
+    """Open the catalog of an output directory once per process, None if it can't be opened"""
+    path = os.path.abspath(get_catalog_path(output_dir))
+    connection = _connections.get(path)
+    if connection is None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, check_same_thread=False)
+            connection.executescript(SCHEMA)
+            connection.commit()
+            _connections[path] = connection
+        except Exception as e:
+            print(f"Error opening scene catalog: {e}")
+            return None
+    return connection
+
+
+def _get_video_id(connection, video_path):
+    """Row id of a video, identified by its content fingerprint"""
+    try:
+        fingerprint = video_fingerprint.get_fingerprint(video_path)
+    except OSError:
+        fingerprint = os.path.abspath(video_path)
+    connection.execute("INSERT INTO videos (fingerprint, path) VALUES (?, ?) "
+                       "ON CONFLICT (fingerprint) DO UPDATE SET path = excluded.path", (fingerprint, video_path))
+    return connection.execute("SELECT id FROM videos WHERE fingerprint = ?", (fingerprint,)).fetchone()[0]
+
+
+def scan_files(paths):
+    """
+    (size, mtime_ns) of each path, None for missing files. Each directory is read
+    once with os.scandir instead of a stat call per path.
+    """
+    by_directory = {}
+    for path in paths:
+        by_directory.setdefault(os.path.dirname(os.path.abspath(path)), []).append(path)
+
+    results = {}
+    for directory, directory_paths in by_directory.items():
+        try:
+            with os.scandir(directory) as entries:
+                found = {entry.name: entry for entry in entries}
+        except OSError:
+            found = {}
+        for path in directory_paths:
+            entry = found.get(os.path.basename(path))
+            try:
+                stat = entry.stat() if entry is not None and entry.is_file() else None
+            except OSError:
+                stat = None
+            results[path] = (stat.st_size, stat.st_mtime_ns) if stat else None
+    return results
+
+
+def save_run(output_dir, run_key, metadata, params=None, video_path=None, artifacts=(), editable_artifacts=()):
+    """
+    Store a run's metadata as rows, replacing an earlier run with the same key.
+    Scenes belong to video_path when given (the source video), otherwise to their
+    own video_path (clips captioned one by one).
+    The manifest records the size and mtime of the artifacts; editable artifacts
+    (description files) only need to exist.
+    """
+    header = {key: value for key, value in metadata.items() if key != "scenes"}
+    now = time.time()
+    stats = scan_files(artifacts)
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return False
+        try:
+            with connection:
+                for table in ("runs", "scenes", "frames", "clips", "artifacts"):
+                    connection.execute(f"DELETE FROM {table} WHERE run_key = ?", (run_key,))
+
+                run_video_id = _get_video_id(connection, video_path) if video_path else None
+                connection.execute("INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?)",
+                                   (run_key, run_video_id, json.dumps(params or {}, default=str),
+                                    json.dumps(header), now, now))
+
+                for position, scene in enumerate(metadata.get("scenes", [])):
+                    scene_index = scene.get("index", position)
+                    data = json.loads(json.dumps(scene))
+                    for entry_name, path_field, text_field in DESCRIPTION_FIELDS:
+                        entry = data.get(entry_name) if entry_name else data
+                        if isinstance(entry, dict) and entry.get(path_field):
+                            connection.execute("INSERT OR REPLACE INTO captions VALUES (?, ?)",
+                                               (entry[path_field], entry.pop(text_field, "")))
+
+                    for kind in ("start", "end"):
+                        frame = data.get(f"{kind}_frame")
+                        if frame:
+                            connection.execute("INSERT INTO frames VALUES (?, ?, ?, ?, ?)",
+                                               (run_key, scene_index, kind, frame.get("image_path", ""),
+                                                frame.get("description_path", "")))
+                    if data.get("video_path"):
+                        connection.execute("INSERT INTO clips VALUES (?, ?, ?)",
+                                           (run_key, scene_index, data["video_path"]))
+
+                    video_id = run_video_id
+                    if video_id is None and data.get("video_path") and os.path.exists(data["video_path"]):
+                        video_id = _get_video_id(connection, data["video_path"])
+                    connection.execute("INSERT INTO scenes VALUES (?, ?, ?, ?, ?, ?)",
+                                       (run_key, scene_index, video_id, scene.get("start_timestamp"),
+                                        scene.get("end_timestamp"), json.dumps(data)))
+
+                connection.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
+                                       [(run_key, path) + stat for path, stat in stats.items() if stat])
+                connection.executemany("INSERT OR REPLACE INTO artifacts VALUES (?, ?, NULL, NULL)",
+                                       [(run_key, path) for path in editable_artifacts])
+            return True
+        except Exception as e:
+            print(f"Error saving run to scene catalog: {e}")
+            return False
+
+
+def load_run(output_dir, run_key):
+    """
+    Metadata of a stored run with the current descriptions filled in, as the node
+    produced it, or None. Marks the run as used.
+    """
+    if not has_catalog(output_dir):
+        return None
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return None
+        try:
+            row = connection.execute("SELECT metadata FROM runs WHERE run_key = ?", (run_key,)).fetchone()
+            if row is None:
+                return None
+            with connection:
+                connection.execute("UPDATE runs SET last_used = ? WHERE run_key = ?", (time.time(), run_key))
+
+            metadata = json.loads(row[0])
+            metadata.setdefault("run_key", run_key)
+            rows = connection.execute(
+                "SELECT data FROM scenes WHERE run_key = ? ORDER BY scene_index", (run_key,)).fetchall()
+            metadata["scenes"] = [json.loads(data) for (data,) in rows]
+            _fill_descriptions(connection, metadata["scenes"])
+            return metadata
+        except Exception as e:
+            print(f"Error reading scene catalog: {e}")
+            return None
+
+
+def find_changed_artifacts(output_dir, run_key):
+    """
+    Artifacts of a run that are missing or whose size or mtime changed since it was
+    stored, checked with one directory scan per output folder. None when the run has
+    no manifest.
+    """
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return None
+        rows = connection.execute("SELECT path, size, mtime_ns FROM artifacts WHERE run_key = ?",
+                                  (run_key,)).fetchall()
+    if not rows:
+        return None
+
+    stats = scan_files([path for path, _, _ in rows])
+    changed = []
+    for path, size, mtime_ns in rows:
+        stat = stats.get(path)
+        if stat is None or (size is not None and stat != (size, mtime_ns)):
+            changed.append(path)
+    return changed
+
+
+def list_runs(output_dir):
+    """(run_key, last_used, artifact paths) of every run, least recently used first"""
+    if not has_catalog(output_dir):
+        return []
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return []
+        runs = connection.execute("SELECT run_key, last_used FROM runs ORDER BY last_used").fetchall()
+        artifacts = {}
+        for run_key, path in connection.execute("SELECT run_key, path FROM artifacts"):
+            artifacts.setdefault(run_key, []).append(path)
+    return [(run_key, last_used, artifacts.get(run_key, [])) for run_key, last_used in runs]
+
+
+def delete_run(output_dir, run_key, deleted_paths=()):
+    """Remove a run's rows, and the caption rows of description files that were deleted"""
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return
+        try:
+            with connection:
+                for table in ("runs", "scenes", "frames", "clips", "artifacts"):
+                    connection.execute(f"DELETE FROM {table} WHERE run_key = ?", (run_key,))
+                connection.executemany("DELETE FROM captions WHERE path = ?", [(path,) for path in deleted_paths])
+        except Exception as e:
+            print(f"Error updating scene catalog: {e}")
+
+
+def restore_descriptions(output_dir, paths):
+    """Rewrite missing description files from the catalog, returns the paths restored"""
+    restored = []
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return restored
+        for path in paths:
+            row = connection.execute("SELECT caption FROM captions WHERE path = ?", (path,)).fetchone()
+            if row is None or os.path.exists(path):
+                continue
+            try:
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(row[0] + '\n')
+                restored.append(path)
+            except Exception as e:
+                print(f"Error restoring {path}: {e}")
+    return restored
+
+
+def _fill_descriptions(connection, scenes):
+    for scene in scenes:
+        for entry_name, path_field, text_field in DESCRIPTION_FIELDS:
+            entry = scene.get(entry_name) if entry_name else scene
+            if isinstance(entry, dict) and entry.get(path_field) and text_field not in entry:
+                row = connection.execute("SELECT caption FROM captions WHERE path = ?",
+                                         (entry[path_field],)).fetchone()
+                entry[text_field] = row[0] if row else ""
+
+
+def get_latest_run_key(output_dir):
+    """Key of the most recently used run, None if the catalog has no runs"""
+    if not has_catalog(output_dir):
+        return None
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return None
+        row = connection.execute("SELECT run_key FROM runs ORDER BY last_used DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def list_scenes(output_dir, run_key=None, video_path=None, scene_index=None, offset=0, limit=100):
+    """
+    Scenes of a run (the latest by default) or of every run on one video, with
+    their frames, clip and descriptions.
+    """
+    if not has_catalog(output_dir):
+        return []
+    query = "SELECT scenes.run_key, scenes.scene_index, scenes.data FROM scenes"
+    conditions, args = [], []
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return []
+        try:
+            if video_path:
+                query += " JOIN videos ON videos.id = scenes.video_id"
+                conditions.append("videos.fingerprint = ?")
+                args.append(video_fingerprint.get_fingerprint(video_path))
+            else:
+                conditions.append("scenes.run_key = ?")
+                args.append(run_key or get_latest_run_key(output_dir))
+            if scene_index is not None:
+                conditions.append("scenes.scene_index = ?")
+                args.append(scene_index)
+            query += " WHERE " + " AND ".join(conditions)
+            query += " ORDER BY scenes.run_key, scenes.scene_index LIMIT ? OFFSET ?"
+            rows = connection.execute(query, args + [limit, offset]).fetchall()
+
+            scenes = []
+            for key, index, data in rows:
+                scene = json.loads(data)
+                scene["run_key"] = key
+                scene["index"] = index
+                scenes.append(scene)
+            _fill_descriptions(connection, scenes)
+            return scenes
+        except Exception as e:
+            print(f"Error reading scene catalog: {e}")
+            return []
+
+
+def set_description(description_path, text):
+    """
+    Update a description in the catalog of the directory holding its file.
+    Returns True if the catalog knew the description.
+    """
+    output_dir = os.path.dirname(os.path.abspath(description_path))
+    if not has_catalog(output_dir):
+        return False
+    with _lock:
+        connection = _connect(output_dir)
+        if connection is None:
+            return False
+        try:
+            with connection:
+                cursor = connection.execute("UPDATE captions SET caption = ? WHERE path IN (?, ?)",
+                                            (text, description_path, os.path.abspath(description_path)))
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Error updating scene catalog: {e}")
+            return False
+
+
+def get_description_path(output_dir, scene_index, run_key=None):
+    """Path of the file holding a scene's main description (start frame or caption)"""
+    scenes = list_scenes(output_dir, run_key, scene_index=scene_index, limit=1)
+    if not scenes:
+        return None
+    scene = scenes[0]
+    return (scene.get("start_frame") or {}).get("description_path") or scene.get("caption_filepath")
+
+
+def export_metadata(output_dir, run_key=None, metadata_path=None):
+    """Write a run's metadata (the latest by default) as metadata.json, returns the path or None"""
+    run_key = run_key or get_latest_run_key(output_dir)
+    metadata = load_run(output_dir, run_key) if run_key else None
+    if metadata is None:
+        return None
+
+    metadata_path = metadata_path or os.path.join(output_dir, "metadata.json")
+    try:
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+        return metadata_path
+    except Exception as e:
+        print(f"Error exporting metadata: {e}")
+        return None
@@ -0,0 +1,60 @@
+# stage_cache.py - Per-stage cache of the scene extraction pipeline
+import os
+import json
+import hashlib
+
+# Stage records are kept next to the outputs they describe
+STAGE_DIR = "stage_cache"
+
+
+def get_stage_key(stage, **inputs):
+    """
+    Key of a stage from the inputs that change its output. Stages depending on an
+    earlier stage pass that stage's key as an input, so they follow its changes.
+    """
+    key_str = json.dumps({"stage": stage, **inputs}, sort_keys=True, default=str)
+    return hashlib.sha1(key_str.encode()).hexdigest()[:16]
+
+
+def get_stage_path(output_dir, stage, key):
+    return os.path.join(output_dir, STAGE_DIR, f"{stage}_{key}.json")
+
+
+def load_stage(output_dir, stage, key):
+    """
+    Artifacts saved by a run of the stage with the same key, None if there are none
+    or a file they list was removed or changed size since (e.g. overwritten by a run
+    with other settings).
+    """
+    stage_path = get_stage_path(output_dir, stage, key)
+    if not os.path.exists(stage_path):
+        return None
+
+    try:
+        with open(stage_path, 'r') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"Error loading {stage} stage: {e}")
+        return None
+
+    for path, size in data.get("files", {}).items():
+        if not os.path.exists(path) or os.path.getsize(path) != size:
+            print(f"{stage.capitalize()} stage outdated ({os.path.basename(path)} changed), recomputing")
+            return None
+
+    print(f"Reusing {stage} stage: {key}")
+    return data
+
+
+def save_stage(output_dir, stage, key, data, files=()):
+    """Save a stage's artifacts with the sizes of the files it wrote"""
+    stage_path = get_stage_path(output_dir, stage, key)
+    try:
+        os.makedirs(os.path.dirname(stage_path), exist_ok=True)
+        record = dict(data, files={path: os.path.getsize(path) for path in files})
+        temp_path = stage_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(temp_path, stage_path)
+    except Exception as e:
+        print(f"Error saving {stage} stage: {e}")
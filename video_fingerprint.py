@@ -0,0 +1,94 @@
+# video_fingerprint.py - Content-based identity of video files for the scene caches
+import os
+import json
+import hashlib
+import threading
+
+import folder_paths
+
+# Sampled byte ranges, spread evenly from the start to the end of the file (container
+# headers and trailers included); files smaller than all samples together are hashed whole
+SAMPLE_COUNT = 8
+SAMPLE_SIZE = 256 * 1024
+
+# Fingerprints are memoised next to the caption store, keyed by path, size and mtime
+INDEX_DIR = "scene_cache"
+INDEX_FILE = "fingerprints.json"
+MAX_INDEX_ENTRIES = 10000
+
+_lock = threading.Lock()
+_index = None
+
+
+def get_index_path():
+    return os.path.join(folder_paths.get_output_directory(), INDEX_DIR, INDEX_FILE)
+
+
+def _load_index():
+    """Load the fingerprint index once per process"""
+    global _index
+    if _index is None:
+        _index = {}
+        path = get_index_path()
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as f:
+                    _index = json.load(f)
+            except Exception as e:
+                print(f"Error loading fingerprint index: {e}")
+    return _index
+
+
+def _save_index(index):
+    """Write the index atomically, dropping the oldest entries beyond MAX_INDEX_ENTRIES"""
+    try:
+        while len(index) > MAX_INDEX_ENTRIES:
+            del index[next(iter(index))]
+        path = get_index_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"Error saving fingerprint index: {e}")
+
+
+def hash_content(video_path, file_size):
+    """Hash of the file size and SAMPLE_COUNT evenly spaced byte ranges"""
+    hasher = hashlib.sha1(str(file_size).encode())
+    with open(video_path, 'rb') as f:
+        if file_size <= SAMPLE_COUNT * SAMPLE_SIZE:
+            hasher.update(f.read())
+        else:
+            step = (file_size - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+            for i in range(SAMPLE_COUNT):
+                f.seek(i * step)
+                hasher.update(f.read(SAMPLE_SIZE))
+    return hasher.hexdigest()[:16]
+
+
+def get_fingerprint(video_path):
+    """
+    Fingerprint of a video's content, the same for renamed, moved or copied files.
+    The sampled ranges are only read again when the file's path, size or mtime
+    changed since it was last fingerprinted.
+    """
+    stat = os.stat(video_path)
+    index_key = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    with _lock:
+        fingerprint = _load_index().get(index_key)
+    if fingerprint:
+        return fingerprint
+
+    fingerprint = hash_content(video_path, stat.st_size)
+    with _lock:
+        index = _load_index()
+        # Entries of an earlier version of this file are outdated
+        path_prefix = index_key.rsplit("|", 2)[0] + "|"
+        for key in [key for key in index if key.startswith(path_prefix)]:
+            del index[key]
+        index[index_key] = fingerprint
+        _save_index(index)
+    return fingerprint
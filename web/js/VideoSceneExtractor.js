@@ -7,6 +7,17 @@ console.log("=== VideoSceneExtractor.js LOADING ===");
 app.registerExtension({
     name: "VideoSceneViewer",
     
+    setup() {
+        // Scenes finished by a background job (Selected Scene First) refresh the node's preview
+        api.addEventListener("video_scene.scenes_ready", ({ detail }) => {
+            console.log("Background scenes ready for node:", detail?.node);
+            const node = app.graph.getNodeById(Number(detail?.node));
+            if (node?.onExecuted) {
+                node.onExecuted(detail.output);
+            }
+        });
+    },
+    
     async beforeRegisterNodeDef(nodeType, nodeData, app) {
         console.log("beforeRegisterNodeDef called for:", nodeData.name);
         
@@ -388,7 +399,7 @@ app.registerExtension({
                 // Load description
                 console.log("Loading description...");
                 try {
-                    const txtFilename = filename.replace('.png', '.txt');
+                    const txtFilename = filename.replace(/\.[^.]+$/, '.txt');
                     const descUrl = `/video_scene/read_description?filename=${encodeURIComponent(txtFilename)}&subfolder=${encodeURIComponent(outputDir)}&rand=${Math.random()}`;
                     console.log("Description URL:", descUrl);
                     
@@ -444,7 +455,7 @@ app.registerExtension({
                 
                 const scenePath = this.scenePaths[this.currentSceneIndex];
                 const filename = scenePath.split('/').pop() || scenePath.split('\\').pop();
-                const txtFilename = filename.replace('.png', '.txt');
+                const txtFilename = filename.replace(/\.[^.]+$/, '.txt');
                 
                 let outputDir = "scene_outputs";
                 const outputDirWidget = this.widgets?.find(w => w.name === "output_dir");